@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+"""
+    benchmarks.generators
+    ---------------------
+
+    Reproducible random DIMACS CNF files stressing
+    different parts of cnfanalysis.
+
+    (C) 2015-2016, CC-0, Lukas Prokop
+"""
+
+import random
+
+
+def _clause(rand, nbvars, length):
+    # distinct variables, see duplicate_literals for repeated ones
+    variables = rand.sample(range(1, nbvars + 1), min(length, nbvars))
+    return ' '.join(str(rand.choice((-1, 1)) * v) for v in variables) + ' 0\n'
+
+
+def random_ksat(fd, clauses, seed=1, k=3):
+    """Uniform random k-SAT at the satisfiability threshold of 3-SAT"""
+    rand = random.Random(seed)
+    nbvars = max(1, int(clauses / 4.26))
+    fd.write('c random {}-SAT\np cnf {} {}\n'.format(k, nbvars, clauses))
+    for i in range(clauses):
+        fd.write(_clause(rand, nbvars, k))
+
+
+def long_clauses(fd, clauses, seed=1):
+    """Few clauses of 50 to 200 literals, about as many literals
+    as :func:`random_ksat` with `clauses` clauses"""
+    rand = random.Random(seed)
+    count = max(1, clauses // 40)
+    nbvars = max(1, clauses // 4)
+    fd.write('c long clauses\np cnf {} {}\n'.format(nbvars, count))
+    for i in range(count):
+        fd.write(_clause(rand, nbvars, rand.randint(50, 200)))
+
+
+def many_variables(fd, clauses, seed=1):
+    """Ternary clauses over ten times as many variables as clauses,
+    most variables occur at most once"""
+    rand = random.Random(seed)
+    nbvars = 10 * clauses
+    fd.write('c many variables\np cnf {} {}\n'.format(nbvars, clauses))
+    for i in range(clauses):
+        fd.write(_clause(rand, nbvars, 3))
+
+
+def heavy_comments(fd, clauses, seed=1):
+    """Random 3-SAT with a comment line after every clause"""
+    rand = random.Random(seed)
+    nbvars = max(1, int(clauses / 4.26))
+    fd.write('c heavy comments\np cnf {} {}\n'.format(nbvars, clauses))
+    for i in range(clauses):
+        fd.write(_clause(rand, nbvars, 3))
+        if i % 10 == 0:
+            fd.write('%\n')
+        else:
+            fd.write('c clause {} was generated with seed {} for benchmarking\n'.format(i, seed))
+
+
+def duplicate_clauses(fd, clauses, seed=1):
+    """Clauses drawn from a pool of `clauses` / 10 distinct clauses
+    with literals in random order, half of the pool being binary"""
+    rand = random.Random(seed)
+    nbvars = max(2, int(clauses / 4.26))
+    pool = [_clause(rand, nbvars, 2 + i % 2).split()[:-1] for i in range(max(1, clauses // 10))]
+    fd.write('c duplicate clauses\np cnf {} {}\n'.format(nbvars, clauses))
+    for i in range(clauses):
+        clause = list(rand.choice(pool))
+        rand.shuffle(clause)
+        fd.write(' '.join(clause) + ' 0\n')
+
+
+def duplicate_literals(fd, clauses, seed=1):
+    """Random 3-SAT clauses of which every fourth repeats a literal
+    and every fourth contains a literal and its complement"""
+    rand = random.Random(seed)
+    nbvars = max(1, int(clauses / 4.26))
+    fd.write('c duplicate literals\np cnf {} {}\n'.format(nbvars, clauses))
+    for i in range(clauses):
+        literals = _clause(rand, nbvars, 3).split()[:-1]
+        if i % 4 == 1:
+            literals.append(literals[0])
+        elif i % 4 == 3:
+            literals.append(str(-int(literals[0])))
+        fd.write(' '.join(literals) + ' 0\n')
+
+
+GENERATORS = {
+    'ksat': random_ksat,
+    'long': long_clauses,
+    'manyvars': many_variables,
+    'comments': heavy_comments,
+    'duplicates': duplicate_clauses,
+    'repeated': duplicate_literals
+}
+
+
+def generate(filepath, kind, clauses, seed=1):
+    """Write a CNF file of `kind` (a key of `GENERATORS`) to `filepath`"""
+    with open(filepath, 'w') as fd:
+        GENERATORS[kind](fd, clauses, seed)
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+
+"""
+    benchmarks.suite
+    ----------------
+
+    Time reading, dispatching per collector, finalizing, hashing and
+    writing for generated CNF files. Every step runs in a fresh process
+    to report its peak resident memory. Results are written as JSON::
+
+        $ python3 benchmarks/suite.py --clauses 100000 -o before.json
+        $ python3 benchmarks/suite.py --clauses 100000 -o after.json
+        $ python3 benchmarks/suite.py --compare before.json after.json
+
+    (C) 2015-2016, CC-0, Lukas Prokop
+"""
+
+import os
+import sys
+import json
+import time
+import fnmatch
+import os.path
+import argparse
+import datetime
+import platform
+import resource
+import tempfile
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cnfanalysis import dimacs, collect, stats
+import generators
+
+
+# number of feature files written per writer step
+WRITES = 100
+
+
+def _features(filepath):
+    state = collect.State()
+    with open(filepath, 'rb') as fd:
+        collect.dispatch_bulk(dimacs.read_bulk(fd), state, *collect.collectors())
+    return state.finalize()
+
+
+def read_text(filepath):
+    start = time.perf_counter()
+    with open(filepath) as fd:
+        for lit in dimacs.read(fd):
+            pass
+    return time.perf_counter() - start
+
+
+def read_bulk(filepath):
+    start = time.perf_counter()
+    with open(filepath, 'rb') as fd:
+        for block in dimacs.read_bulk(fd):
+            pass
+    return time.perf_counter() - start
+
+
+def load(filepath):
+    start = time.perf_counter()
+    dimacs.load(filepath)
+    return time.perf_counter() - start
+
+
+def dispatch_literals(filepath):
+    """collect.dispatch of all collectors over dimacs.read"""
+    state = collect.State()
+    start = time.perf_counter()
+    with open(filepath) as fd:
+        collect.dispatch(dimacs.read(fd), state, *collect.collectors())
+    return time.perf_counter() - start
+
+
+def dispatch_function(filepath, group=None, fn=None):
+    """dispatch_bulk of the header functions of `group` and `fn` only.
+    Without `fn` only reading and dispatching itself is timed."""
+    groups = {group} if group else set()
+    header_fns = collect.collectors(groups)[0]
+    clause_fns, literal_fns = [], []
+    if fn in collect.COLLECTORS.get(group, ([], [], []))[1]:
+        clause_fns.append(fn)
+    elif fn is not None:
+        literal_fns.append(fn)
+    state = collect.State(groups)
+    start = time.perf_counter()
+    with open(filepath, 'rb') as fd:
+        collect.dispatch_bulk(dimacs.read_bulk(fd), state, header_fns, clause_fns, literal_fns)
+    return time.perf_counter() - start
+
+
+def vectorized(filepath):
+    cnf = dimacs.load(filepath)
+    start = time.perf_counter()
+    collect.VectorizedState().consume(cnf)
+    return time.perf_counter() - start
+
+
+def finalize(filepath, group):
+    state = collect.State({group})
+    with open(filepath, 'rb') as fd:
+        collect.dispatch_bulk(dimacs.read_bulk(fd), state, *collect.collectors({group}))
+    start = time.perf_counter()
+    state.finalize()
+    return time.perf_counter() - start
+
+
+def md5sha1hashes(filepath):
+    start = time.perf_counter()
+    stats.md5sha1hashes(filepath)
+    return time.perf_counter() - start
+
+
+def cnf2hash(filepath):
+    start = time.perf_counter()
+    stats.cnf2hash(filepath)
+    return time.perf_counter() - start
+
+
+def file_hashes(filepath):
+    start = time.perf_counter()
+    stats.file_hashes(filepath)
+    return time.perf_counter() - start
+
+
+def write(filepath, fmt):
+    """Time writing the features of `filepath` WRITES times"""
+    features = _features(filepath)
+    writer = {'json': stats.write_json, 'xml': stats.write_xml}[fmt]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        start = time.perf_counter()
+        for i in range(WRITES):
+            outfile = os.path.join(tmpdir, '{}.stats.{}'.format(i, fmt))
+            writer(outfile, features, sourcefile=filepath)
+        return time.perf_counter() - start
+
+
+def steps():
+    """Return pairs of step name and (function, arguments)"""
+    result = [
+        ('dimacs.read', (read_text, ())),
+        ('dimacs.read_bulk', (read_bulk, ())),
+        ('dimacs.load', (load, ())),
+        ('collect.dispatch', (dispatch_literals, ())),
+        ('dispatch_bulk:none', (dispatch_function, ()))
+    ]
+    for group in collect.GROUPS:
+        header_fns, clause_fns, literal_fns = collect.COLLECTORS[group]
+        for fn in clause_fns + literal_fns:
+            result.append(('dispatch_bulk:' + fn.__name__, (dispatch_function, (group, fn))))
+    result.append(('VectorizedState.consume', (vectorized, ())))
+    for group in collect.GROUPS:
+        result.append(('finalize:' + group, (finalize, (group,))))
+    result += [
+        ('stats.md5sha1hashes', (md5sha1hashes, ())),
+        ('stats.cnf2hash', (cnf2hash, ())),
+        ('stats.file_hashes', (file_hashes, ())),
+        ('stats.write_json', (write, ('json',))),
+        ('stats.write_xml', (write, ('xml',)))
+    ]
+    return result
+
+
+def _child(fn, filepath, args):
+    seconds = fn(filepath, *args)
+    # ru_maxrss is given in kilobytes on Linux
+    return seconds, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _size(filepath):
+    cnf = dimacs.load(filepath)
+    return len(cnf.literals), len(cnf)
+
+
+def measure(fn, *args):
+    """Run `fn` in a new process and return its result and peak memory"""
+    context = multiprocessing.get_context('fork')
+    with context.Pool(1) as pool:
+        return pool.apply(fn, args)
+
+
+def run(kinds, clauses, patterns, seed=1):
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for kind in kinds:
+            filepath = os.path.join(tmpdir, kind + '.cnf')
+            generators.generate(filepath, kind, clauses, seed)
+            size = os.path.getsize(filepath)
+            (literals, count), rss = measure(_child, _size, filepath, ())
+            baseline = None
+
+            for name, (fn, args) in steps():
+                if not any(fnmatch.fnmatchcase(name, p) for p in patterns):
+                    continue
+                try:
+                    seconds, rss = measure(_child, fn, filepath, args)
+                except ImportError as e:
+                    print('{} {}: skipped ({})'.format(kind, name, e), file=sys.stderr)
+                    continue
+                result = {
+                    'cnf': kind, 'step': name, 'bytes': size,
+                    'literals': literals, 'clauses': count,
+                    'seconds': seconds, 'peak_rss': rss
+                }
+                if fn is write:
+                    result['seconds_per_write'] = seconds / WRITES
+                else:
+                    result['literals_per_second'] = literals / seconds
+                    result['mb_per_second'] = size / 1e6 / seconds
+                if name == 'dispatch_bulk:none':
+                    baseline = seconds
+                elif name.startswith('dispatch_bulk:') and baseline is not None:
+                    # time spent in the collector function itself
+                    result['net_seconds'] = seconds - baseline
+                results.append(result)
+                print('{:9} {:40} {:8.3f} s {:8.1f} MB'.format(kind, name, seconds, rss / 1e6),
+                      file=sys.stderr)
+    return results
+
+
+def compare(before, after):
+    """Print the speedup of every step from results `before` to `after`"""
+    old = dict(((r['cnf'], r['step']), r['seconds']) for r in before['results'])
+    for r in after['results']:
+        key = (r['cnf'], r['step'])
+        if key in old:
+            print('{:9} {:40} {:8.3f} s -> {:8.3f} s  {:6.2f}x'
+                  .format(r['cnf'], r['step'], old[key], r['seconds'], old[key] / r['seconds']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='cnfanalysis benchmark suite')
+    parser.add_argument('--clauses', type=int, default=100000,
+                        help='number of clauses of random k-SAT instances')
+    parser.add_argument('--kinds', default=','.join(sorted(generators.GENERATORS)),
+                        help='comma-separated kinds of CNF files to generate')
+    parser.add_argument('--steps', default='*',
+                        help='comma-separated patterns of steps to run, like "dispatch_bulk:*"')
+    parser.add_argument('--seed', type=int, default=1,
+                        help='seed for generators')
+    parser.add_argument('-o', '--output',
+                        help='file to write JSON results to, default: stdout')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'),
+                        help='compare two JSON results instead of running benchmarks')
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as before, open(args.compare[1]) as after:
+            compare(json.load(before), json.load(after))
+        return
+
+    kinds = [k.strip() for k in args.kinds.split(',') if k.strip()]
+    for kind in kinds:
+        if kind not in generators.GENERATORS:
+            parser.error('Unknown kind of CNF "{}"'.format(kind))
+    patterns = [p.strip() for p in args.steps.split(',') if p.strip()]
+
+    data = {
+        'timestamp': datetime.datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'clauses': args.clauses,
+        'seed': args.seed,
+        'results': run(kinds, args.clauses, patterns, args.seed)
+    }
+    if args.output:
+        with open(args.output, 'w') as fd:
+            json.dump(data, fd, indent=2, sort_keys=True)
+    else:
+        json.dump(data, sys.stdout, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
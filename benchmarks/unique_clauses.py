@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+"""
+    benchmarks.unique_clauses
+    -------------------------
+
+    Memory and time of counting distinct clauses with
+    fingerprints in a FingerprintSet compared to a Python
+    set of clause tuples, for instances with many duplicate
+    clauses and instances of distinct clauses.
+
+    Usage: python3 benchmarks/unique_clauses.py [clauses]
+
+    (C) 2015-2016, CC-0, Lukas Prokop
+"""
+
+import os
+import sys
+import time
+import os.path
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cnfanalysis import dimacs, collect, fingerprints
+import generators
+
+
+def with_fingerprints(cnf):
+    unique = fingerprints.FingerprintSet()
+    for clause in cnf:
+        unique.add(fingerprints.fingerprint(clause, cnf.nbvars))
+    return len(unique)
+
+
+def with_tuples(cnf):
+    unique = set()
+    for clause in cnf:
+        unique.add(tuple(sorted(set(clause))))
+    return len(unique)
+
+
+def with_state(cnf):
+    """All clause retaining structures of collect.State"""
+    state = collect.State({'expensive'})
+    collect.dispatch_cnf(cnf, state, *collect.collectors({'expensive'}))
+    return len(state.clause_fingerprints)
+
+
+def measure(fn, cnf):
+    start = time.perf_counter()
+    result = fn(cnf)
+    duration = time.perf_counter() - start
+    # memory is measured separately, tracing slows down hashing
+    tracemalloc.start()
+    fn(cnf)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, duration, peak
+
+
+def main(clauses=1000000):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for kind in ('duplicates', 'ksat'):
+            filepath = os.path.join(tmpdir, kind + '.cnf')
+            generators.generate(filepath, kind, clauses)
+            cnf = dimacs.load(filepath)
+            print('{}: {} clauses'.format(kind, len(cnf)))
+            results = set()
+            for name, fn in [('FingerprintSet', with_fingerprints),
+                             ('set of tuples', with_tuples),
+                             ('State (expensive)', with_state)]:
+                unique, duration, peak = measure(fn, cnf)
+                results.add(unique)
+                print('  {:18} {:8} unique  {:6.2f} s  {:8.1f} MB  {:6.1f} bytes/clause'
+                      .format(name, unique, duration, peak / 1e6, peak / len(cnf)))
+            assert len(results) == 1
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+"""
+    benchmarks.xml_features
+    -----------------------
+
+    Throughput of writing and reading XML featuresfiles
+    with many ``<file>`` elements.
+
+    Usage: python3 benchmarks/xml_features.py [records]
+
+    (C) 2015-2016, CC-0, Lukas Prokop
+"""
+
+import os
+import sys
+import time
+import random
+import os.path
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cnfanalysis import stats, collect
+
+
+def record(rand, index):
+    """Generate metadata and random values for all features"""
+    features = {}
+    for group in collect.GROUPS:
+        for name in collect.FEATURE_GROUPS[group]:
+            typ = collect.feature_type(name)
+            if typ is bool:
+                features[name] = rand.random() < 0.5
+            elif typ is int:
+                features[name] = rand.randrange(1 << 20)
+            else:
+                features[name] = rand.random()
+    return {
+        '@filename': 'instance{}.cnf'.format(index),
+        '@timestamp': '2016-08-03T10:52:23.412694',
+        '@version': '1.0.0',
+        '@sha1sum': '{:040x}'.format(rand.getrandbits(160)),
+        'featuring': features
+    }
+
+
+def main(count=10000):
+    rand = random.Random(42)
+    records = [record(rand, i) for i in range(count)]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filepath = os.path.join(tmpdir, 'corpus.stats.xml')
+
+        start = time.perf_counter()
+        with stats.XMLWriter(filepath) as writer:
+            for r in records:
+                writer.write(r)
+        written = time.perf_counter() - start
+        size = os.path.getsize(filepath)
+
+        start = time.perf_counter()
+        read = list(stats.read_xml(filepath))
+        duration = time.perf_counter() - start
+        assert read == records
+
+        # memory is measured separately, tracing slows down parsing
+        del read
+        tracemalloc.start()
+        for r in stats.read_xml(filepath):
+            pass
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    print('{} records, {:.1f} MB'.format(count, size / 1e6))
+    print('write: {:.2f} s, {:.0f} records/s'.format(written, count / written))
+    print('read:  {:.2f} s, {:.0f} records/s, {:.1f} MB/s'
+          .format(duration, count / duration, size / 1e6 / duration))
+    print('peak memory while streaming: {:.1f} MB'.format(peak / 1e6))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -1,3 +1,4 @@
-from .dimacs import read
-from .collect import dispatch
+from .dimacs import read, read_bulk, load
+from .collect import dispatch, dispatch_bulk, dispatch_cnf
 from .stats import write_json as write
+from .batch import analyze, analyze_many
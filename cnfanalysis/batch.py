@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+"""
+    cnfanalysis.batch
+    -----------------
+
+    Compute features of CNFs held in memory, like formulas generated
+    by a Python program, without writing DIMACS files.
+
+    (C) 2015-2016, CC-0, Lukas Prokop
+"""
+
+import array
+import numbers
+import functools
+import itertools
+import multiprocessing
+
+from . import dimacs
+from . import collect
+
+
+def to_cnf(formula, nbvars=None, offsets=None):
+    """Convert a formula to a :class:`cnfanalysis.dimacs.CNF`.
+    `formula` is one of
+
+    * a :class:`cnfanalysis.dimacs.CNF`, returned as is
+    * a sequence of clauses, each an iterable of literals like ``[[1, -2], [2]]``
+    * a flat sequence of literals, each clause terminated by zero like
+      ``[1, -2, 0, 2, 0]`` (a final clause without zero is terminated),
+      including integer arrays like ``array('i')`` and NumPy arrays
+    * a literal buffer without zeros if `offsets` are given, clause
+      ``i`` being ``formula[offsets[i]:offsets[i + 1]]``
+
+    :param formula:     the clauses of the CNF
+    :param nbvars:      number of variables, default: largest variable used
+    :type nbvars:       int
+    :param offsets:     clause offsets into the literal buffer `formula`
+    :type offsets:      sequence of int
+    :return:            the CNF in compressed sparse row layout
+    :rtype:             cnfanalysis.dimacs.CNF
+    """
+    if isinstance(formula, dimacs.CNF):
+        return formula
+    if offsets is not None:
+        literals = array.array('i', formula)
+        offsets = array.array('q', offsets)
+    else:
+        formula = list(formula)
+        if formula and not isinstance(formula[0], numbers.Integral):
+            literals = array.array('i', itertools.chain.from_iterable(formula))
+            offsets = array.array('q', [0])
+            offsets.extend(itertools.accumulate(map(len, formula)))
+        else:
+            literals, offsets = _split_zeros(formula)
+    if nbvars is None:
+        nbvars = max(max(literals, default=0), -min(literals, default=0))
+    return dimacs.CNF(nbvars, len(offsets) - 1, literals, offsets)
+
+
+def _split_zeros(lits):
+    """Split a flat list of zero-terminated clauses into
+    a literal buffer and clause offsets"""
+    if lits and lits[-1] != 0:
+        lits = lits + [0]
+    ends = []
+    pos = -1
+    try:
+        while True:
+            pos = lits.index(0, pos + 1)
+            ends.append(pos - len(ends))
+    except ValueError:
+        pass
+    offsets = array.array('q', [0])
+    offsets.extend(ends)
+    return array.array('i', filter(None, lits)), offsets
+
+
+class Analyzer:
+    """Computes the features of many formulas. The feature groups and
+    collectors for `selection` are determined once. Features are
+    computed by :class:`cnfanalysis.collect.State` and its collectors,
+    hence they equal the features of a DIMACS file of the same clauses.
+
+    :param selection:   feature names, patterns or groups to compute,
+                        None computes all features
+    :type selection:    [str]
+    """
+
+    def __init__(self, selection=None):
+        self.selection = selection
+        self.groups = collect.feature_groups(selection)
+        self.header_fns, self.clause_fns, self.literal_fns = collect.collectors(self.groups)
+
+    def __call__(self, formula, nbvars=None, offsets=None):
+        """Return the features of `formula` (see :func:`to_cnf`) as dictionary"""
+        cnf = to_cnf(formula, nbvars, offsets)
+        # literals are range-checked by the linear collectors, otherwise here
+        if 'linear' not in self.groups and cnf.literals:
+            lits = cnf.literals
+            if not (-cnf.nbvars <= min(lits) and max(lits) <= cnf.nbvars):
+                lit = next(l for l in lits if not (-cnf.nbvars <= l <= cnf.nbvars))
+                errmsg = 'Literal {} exceeds nbvars [-{}, {}]'
+                raise dimacs.NbVarsError(errmsg.format(lit, cnf.nbvars, cnf.nbvars))
+        state = collect.State(self.groups)
+        collect.dispatch_cnf(cnf, state, self.header_fns, self.clause_fns, self.literal_fns)
+        return collect.select_features(state.finalize(), self.selection)
+
+
+def analyze(formula, nbvars=None, offsets=None, selection=None):
+    """Return the features of a CNF held in memory.
+
+        >>> features = analyze([[1, -2], [2, 3], [-1]])
+        >>> features['clauses_count'], features['nbvars']
+        (3, 3)
+
+    :param formula:     clauses, flat zero-terminated literals or a literal
+                        buffer with `offsets`, see :func:`to_cnf`
+    :param nbvars:      number of variables, default: largest variable used
+    :type nbvars:       int
+    :param offsets:     clause offsets into the literal buffer `formula`
+    :type offsets:      sequence of int
+    :param selection:   feature names, patterns or groups to compute,
+                        None computes all features
+    :type selection:    [str]
+    :return:            A dictionary associating feature name to its value
+    :rtype:             dict
+    """
+    return Analyzer(selection)(formula, nbvars, offsets)
+
+
+def _analyze_args(analyzer, args):
+    formula, kwargs = args
+    return analyzer(formula, **kwargs)
+
+
+def analyze_many(formulas, selection=None, processes=1, chunksize=64, kwargs=None):
+    """Yield the features of all `formulas` in order. Every formula
+    is given like `formula` of :func:`to_cnf`. The `nbvars` and `offsets`
+    of the formulas are given as dictionaries in `kwargs` in the same order.
+    Setup is done once for all formulas. If `processes` exceeds one,
+    formulas are sent to a pool of processes in chunks of `chunksize`.
+
+        >>> [f['nbvars'] for f in analyze_many([[[1, -2]], [[1]]], kwargs=[{}, {'nbvars': 4}])]
+        [2, 4]
+
+    :param formulas:    iterable of formulas
+    :param selection:   feature names, patterns or groups to compute,
+                        None computes all features
+    :type selection:    [str]
+    :param processes:   number of processes
+    :type processes:    int
+    :param chunksize:   number of formulas sent to a process at once
+    :type chunksize:    int
+    :param kwargs:      iterable of keyword arguments `nbvars` and `offsets`
+                        of :func:`to_cnf` per formula or None
+    :type kwargs:       iterable of dict
+    :return:            generator of feature dictionaries
+    """
+    analyzer = Analyzer(selection)
+    args = zip(formulas, kwargs if kwargs is not None else itertools.repeat({}))
+    if processes <= 1:
+        for arg in args:
+            yield _analyze_args(analyzer, arg)
+        return
+    with multiprocessing.Pool(processes) as pool:
+        fn = functools.partial(_analyze_args, analyzer)
+        for features in pool.imap(fn, args, chunksize):
+            yield features
+
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+
+"""
+    cnfanalysis.binary
+    ------------------
+
+    Binary sidecar files of pre-parsed DIMACS CNF files. A sidecar
+    stores the literal buffer and clause offsets of a
+    :class:`cnfanalysis.dimacs.CNF` and is memory-mapped by later
+    runs instead of parsing the DIMACS file again.
+
+    Layout (version 1, all integers little endian)::
+
+        offset  size  field
+             0     8  magic b'CNFBIN\r\n'
+             8     4  version (uint32)
+            12     4  flags (uint32), bit 0: cnfhash is valid
+            16     8  nbvars of the header line (uint64)
+            24     8  nbclauses of the header line (uint64)
+            32     8  number C of clauses stored (uint64)
+            40     8  number L of literals stored (uint64)
+            48    20  SHA1 digest of the (decompressed) source file
+            68    16  MD5 digest of the (decompressed) source file
+            84    20  digest of the cnfhash of the source file
+           104    32  prefixes of lines ignored, sorted, UTF-8, NUL padded
+           136     8  reserved, zero
+           144   4*L  literals without terminating zeros (int32)
+                      zero padding to a multiple of 8 bytes
+               8*C+8  clause offsets into the literals (int64)
+
+    Clause ``i`` is ``literals[offsets[i]:offsets[i + 1]]``.
+    Sidecars of another version, of other ignored line prefixes or
+    of a source file with a different SHA1 digest are stale.
+
+    (C) 2015-2016, CC-0, Lukas Prokop
+"""
+
+import os
+import sys
+import mmap
+import array
+import struct
+import binascii
+
+from . import dimacs
+from . import stats
+
+
+MAGIC = b'CNFBIN\r\n'
+# increment whenever the layout changes
+VERSION = 1
+FLAG_CNFHASH = 1
+HEADER = struct.Struct('<8sIIQQQQ20s16s20s32s8x')
+EXTENSION = '.cnfbin'
+
+
+def sidecar_path(filepath):
+    """Filepath of the sidecar of CNF file `filepath`"""
+    return filepath + EXTENSION
+
+
+def _ignore_field(ignore_lines):
+    """Encode the prefixes of lines to ignore independent of their order"""
+    field = ' '.join(sorted(set(ignore_lines))).encode('utf-8')
+    if len(field) > 32:
+        raise ValueError('Prefixes of lines to ignore exceed 32 bytes: {}'.format(field))
+    return field
+
+
+def _padding(nbliterals):
+    return -4 * nbliterals % 8
+
+
+def write(filepath, cnf, md5sum, sha1sum, cnf_hash=None, ignore_lines='c%'):
+    """Write `cnf` to sidecar file `filepath`. The file
+    is replaced atomically.
+
+    :param filepath:        filepath of the sidecar
+    :type filepath:         str
+    :param cnf:             CNF parsed from the source file
+    :type cnf:              cnfanalysis.dimacs.CNF
+    :param md5sum:          MD5 digest of the source file in hex
+    :type md5sum:           str
+    :param sha1sum:         SHA1 digest of the source file in hex
+    :type sha1sum:          str
+    :param cnf_hash:        cnfhash of the source file or None if invalid
+    :type cnf_hash:         str
+    :param ignore_lines:    prefixes of lines ignored when parsing
+    :type ignore_lines:     [str]
+    """
+    flags, digest = 0, bytes(20)
+    if cnf_hash is not None:
+        flags |= FLAG_CNFHASH
+        digest = binascii.unhexlify(cnf_hash.split('$', 1)[1])
+    header = HEADER.pack(MAGIC, VERSION, flags, cnf.nbvars, cnf.nbclauses, len(cnf),
+                         len(cnf.literals), binascii.unhexlify(sha1sum),
+                         binascii.unhexlify(md5sum), digest, _ignore_field(ignore_lines))
+    literals = array.array('i', cnf.literals)
+    offsets = array.array('q', cnf.offsets)
+    if sys.byteorder != 'little':
+        literals.byteswap()
+        offsets.byteswap()
+
+    tmppath = filepath + '.tmp'
+    with open(tmppath, 'wb') as fd:
+        fd.write(header)
+        literals.tofile(fd)
+        fd.write(bytes(_padding(len(literals))))
+        offsets.tofile(fd)
+    os.replace(tmppath, filepath)
+
+
+def convert(sourcefile, filepath=None, ignore_lines='c%', chunk_size=1 << 20):
+    """Parse the (compressed) DIMACS CNF file `sourcefile` and write its sidecar.
+    Literals are checked against nbvars, because the feature
+    engines do not check the literals of sidecars.
+
+    :param sourcefile:      filepath of DIMACS CNF file
+    :type sourcefile:       str
+    :param filepath:        filepath of the sidecar, default: :func:`sidecar_path`
+    :type filepath:         str
+    :param ignore_lines:    prefixes of lines to ignore
+    :type ignore_lines:     [str]
+    :param chunk_size:      number of bytes to tokenize at once
+    :type chunk_size:       int
+    :return:                filepath of the sidecar
+    :rtype:                 str
+    """
+    filepath = filepath or sidecar_path(sourcefile)
+    with dimacs.open_cnf(sourcefile) as fd:
+        hashed = stats.HashedReader(fd, ignore_lines, check_nbvars=True, chunk_size=chunk_size)
+        cnf = dimacs.CNF.from_reader(iter(hashed))
+    try:
+        cnf_hash = hashed.cnfhash.hexdigest()
+    except ValueError:
+        cnf_hash = None
+    write(filepath, cnf, hashed.md5.hexdigest(), hashed.sha1.hexdigest(),
+          cnf_hash, ignore_lines)
+    return filepath
+
+
+def read_header(filepath):
+    """Read the header of sidecar file `filepath`.
+
+    :return:    header fields by name as in the layout of this module,
+                digests in hex and 'cnfhash' None if invalid
+    :rtype:     dict
+    :raises ValueError:     if `filepath` is no sidecar
+    """
+    with open(filepath, 'rb') as fd:
+        data = fd.read(HEADER.size)
+    return _unpack_header(data, filepath)
+
+
+def _unpack_header(data, filepath):
+    if len(data) < HEADER.size or not data.startswith(MAGIC):
+        raise ValueError('Not a CNF sidecar file: {}'.format(filepath))
+    (magic, version, flags, nbvars, nbclauses, clauses, literals,
+     sha1sum, md5sum, cnf_hash, ignore_lines) = HEADER.unpack_from(data)
+    return {
+        'version': version,
+        'nbvars': nbvars,
+        'nbclauses': nbclauses,
+        'clauses': clauses,
+        'literals': literals,
+        'sha1sum': binascii.hexlify(sha1sum).decode('ascii'),
+        'md5sum': binascii.hexlify(md5sum).decode('ascii'),
+        'cnfhash': ('cnf2$' + binascii.hexlify(cnf_hash).decode('ascii')
+                    if flags & FLAG_CNFHASH else None),
+        'ignore_lines': ignore_lines.rstrip(b'\x00')
+    }
+
+
+def load(filepath):
+    """Memory-map sidecar file `filepath`. On little endian machines
+    the literals and offsets of the CNF returned are memoryviews of the
+    mapping, hence nothing is copied. The mapping is closed when the
+    CNF is garbage collected.
+
+    :return:    the CNF and the header as returned by :func:`read_header`
+    :rtype:     (cnfanalysis.dimacs.CNF, dict)
+    :raises ValueError:     if `filepath` is no sidecar of this version
+    """
+    with open(filepath, 'rb') as fd:
+        mm = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+    header = _unpack_header(mm[:HEADER.size], filepath)
+    if header['version'] != VERSION:
+        raise ValueError('Sidecar {} has version {}, expected {}'
+                         .format(filepath, header['version'], VERSION))
+    nbliterals, clauses = header['literals'], header['clauses']
+    start = HEADER.size + 4 * nbliterals + _padding(nbliterals)
+    if len(mm) != start + 8 * (clauses + 1):
+        raise ValueError('Truncated CNF sidecar file: {}'.format(filepath))
+
+    view = memoryview(mm)
+    literals = view[HEADER.size:HEADER.size + 4 * nbliterals].cast('i')
+    offsets = view[start:].cast('q')
+    if sys.byteorder != 'little':
+        literals, offsets = array.array('i', literals), array.array('q', offsets)
+        literals.byteswap()
+        offsets.byteswap()
+    cnf = dimacs.CNF(header['nbvars'], header['nbclauses'], literals, offsets)
+    return cnf, header
+
+
+def load_fresh(filepath, sourcefile, ignore_lines='c%', digests=None):
+    """Like :func:`load`, but return None if the sidecar is stale for
+    `sourcefile`. Unless given as `digests`, the MD5 and SHA1 digests
+    of `sourcefile` are computed, which reads it but does not parse it.
+
+    :param filepath:        filepath of the sidecar
+    :type filepath:         str
+    :param sourcefile:      filepath of the DIMACS CNF file
+    :type sourcefile:       str
+    :param ignore_lines:    prefixes of lines to ignore
+    :type ignore_lines:     [str]
+    :param digests:         MD5 and SHA1 digests of `sourcefile` in hex or None
+    :type digests:          (str, str)
+    :return:                the CNF and metadata with hashes or None
+    :rtype:                 (cnfanalysis.dimacs.CNF, dict)
+    """
+    try:
+        header = read_header(filepath)
+    except (OSError, ValueError):
+        return None
+    if header['version'] != VERSION or header['ignore_lines'] != _ignore_field(ignore_lines):
+        return None
+    md5sum, sha1sum = digests or stats.md5sha1hashes(sourcefile)
+    if header['sha1sum'] != sha1sum:
+        return None
+    try:
+        cnf, header = load(filepath)
+    except ValueError:
+        return None
+    meta = {"@md5sum": md5sum, "@sha1sum": sha1sum}
+    if header['cnfhash'] is not None:
+        meta['@cnfhash'] = header['cnfhash']
+    return cnf, meta
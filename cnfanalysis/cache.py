@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+
+"""
+    cnfanalysis.cache
+    -----------------
+
+    Persistent cache of features of CNF files addressed by
+    the SHA1 digest of their (decompressed) content.
+
+    (C) 2015-2016, CC-0, Lukas Prokop
+"""
+
+import os
+import json
+import time
+import sqlite3
+
+from . import collect
+
+
+# maximum size of cached feature data in bytes by default
+DEFAULT_MAX_SIZE = 256 << 20
+# entries are not keyed by the prefixes of ignored lines,
+# hence only features computed with the default ones are cached
+IGNORE_LINES = 'c%'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS features (
+    sha1sum TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    groups TEXT NOT NULL,
+    features TEXT NOT NULL,
+    md5sum TEXT,
+    cnfhash TEXT,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (sha1sum, version)
+);
+CREATE INDEX IF NOT EXISTS features_accessed ON features (accessed);
+'''
+
+
+def cacheable(ignore_lines):
+    """Can features computed with prefixes of lines `ignore_lines`
+    ignored be looked up in and stored in the cache?"""
+    return set(ignore_lines) == set(IGNORE_LINES)
+
+
+def cache_dir():
+    """Directory of cnfanalysis in the user's cache directory"""
+    cachedir = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(cachedir, 'cnfanalysis')
+
+
+def default_path():
+    """Filepath of the cache database in the user's cache directory"""
+    return os.path.join(cache_dir(), 'features.sqlite')
+
+
+class FeatureCache:
+    """Cache of features in an SQLite database at `path`.
+    An entry is identified by the SHA1 digest of a CNF file and
+    :data:`cnfanalysis.collect.FEATURES_VERSION`, hence renamed and
+    copied files share an entry and entries of older versions
+    are never returned. If the size of all feature data exceeds
+    `max_size` bytes, least recently used entries are evicted.
+
+    :param path:        filepath of the database, None for :func:`default_path`
+    :type path:         str
+    :param max_size:    maximum size of feature data in bytes or None
+    :type max_size:     int
+    """
+
+    def __init__(self, path=None, max_size=DEFAULT_MAX_SIZE):
+        self.path = path or default_path()
+        self.max_size = max_size
+        dirname = os.path.dirname(self.path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        # several processes might write concurrently, hence wait for locks
+        self.db = sqlite3.connect(self.path, timeout=60)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def get(self, sha1sum, groups=collect.GROUPS, hashes=False):
+        """Look up features of the CNF file with SHA1 digest `sha1sum`.
+
+        :param sha1sum:     SHA1 digest of the CNF file
+        :type sha1sum:      str
+        :param groups:      feature groups required
+        :type groups:       {str}
+        :param hashes:      are the MD5 digest and cnfhash required?
+        :type hashes:       bool
+        :return:            features and metadata with hashes or None
+                            if the entry is missing or incomplete
+        :rtype:             (dict, dict)
+        """
+        with self.db:
+            row = self.db.execute(
+                'SELECT groups, features, md5sum, cnfhash FROM features '
+                'WHERE sha1sum = ? AND version = ?',
+                (sha1sum, collect.FEATURES_VERSION)).fetchone()
+            if row is None:
+                return None
+            cached_groups, features, md5sum, cnf_hash = row
+            if not set(groups) <= set(cached_groups.split()):
+                return None
+            if hashes and cnf_hash is None:
+                return None
+            self.db.execute(
+                'UPDATE features SET accessed = ? WHERE sha1sum = ? AND version = ?',
+                (time.time(), sha1sum, collect.FEATURES_VERSION))
+
+        meta = {}
+        if cnf_hash is not None:
+            meta = {"@md5sum": md5sum, "@sha1sum": sha1sum, "@cnfhash": cnf_hash}
+        return json.loads(features), meta
+
+    def put(self, sha1sum, groups, features, meta=None):
+        """Store the features of groups `groups` of the CNF file with
+        SHA1 digest `sha1sum`. Features of other groups already
+        cached for this file are kept.
+
+        :param sha1sum:     SHA1 digest of the CNF file
+        :type sha1sum:      str
+        :param groups:      feature groups computed
+        :type groups:       {str}
+        :param features:    all features of `groups` as returned
+                            by :meth:`cnfanalysis.collect.State.finalize`
+        :type features:     dict
+        :param meta:        metadata with '@md5sum' and '@cnfhash' or None
+        :type meta:         dict
+        """
+        meta = meta or {}
+        with self.db:
+            row = self.db.execute(
+                'SELECT groups, features, md5sum, cnfhash FROM features '
+                'WHERE sha1sum = ? AND version = ?',
+                (sha1sum, collect.FEATURES_VERSION)).fetchone()
+            md5sum, cnf_hash = meta.get('@md5sum'), meta.get('@cnfhash')
+            if row is not None:
+                cached_features = json.loads(row[1])
+                cached_features.update(features)
+                features = cached_features
+                groups = set(groups) | set(row[0].split())
+                md5sum, cnf_hash = md5sum or row[2], cnf_hash or row[3]
+
+            data = json.dumps(features, sort_keys=True)
+            self.db.execute(
+                'INSERT OR REPLACE INTO features VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (sha1sum, collect.FEATURES_VERSION, ' '.join(sorted(groups)),
+                 data, md5sum, cnf_hash, len(data), time.time()))
+        if self.max_size is not None:
+            self.prune(self.max_size)
+
+    def size(self):
+        """Return number of entries and size of feature data in bytes"""
+        count, size = self.db.execute('SELECT COUNT(*), SUM(size) FROM features').fetchone()
+        return count, size or 0
+
+    def prune(self, max_size):
+        """Evict least recently used entries until the size
+        of all feature data is at most `max_size` bytes.
+
+        :return:            number of entries evicted
+        :rtype:             int
+        """
+        with self.db:
+            count, size = self.size()
+            evicted = []
+            rows = self.db.execute(
+                'SELECT sha1sum, version, size FROM features ORDER BY accessed')
+            for sha1sum, version, entry_size in rows:
+                if size <= max_size:
+                    break
+                evicted.append((sha1sum, version))
+                size -= entry_size
+            self.db.executemany(
+                'DELETE FROM features WHERE sha1sum = ? AND version = ?', evicted)
+        return len(evicted)
+
+    def clear(self, outdated=False):
+        """Remove all entries or, if `outdated`, only entries
+        of other versions than the current one.
+
+        :return:            number of entries removed
+        :rtype:             int
+        """
+        with self.db:
+            if outdated:
+                cursor = self.db.execute('DELETE FROM features WHERE version != ?',
+                                         (collect.FEATURES_VERSION,))
+            else:
+                cursor = self.db.execute('DELETE FROM features')
+        self.db.execute('VACUUM')
+        return cursor.rowcount
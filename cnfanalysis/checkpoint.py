@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+
+"""
+    cnfanalysis.checkpoint
+    ----------------------
+
+    Checkpoints of long analyses of one CNF file. A checkpoint stores
+    the :class:`cnfanalysis.collect.State` after the clauses read so
+    far and the byte offset of the next clause in the (decompressed)
+    CNF file. An analysis interrupted by a crash or preemption is
+    resumed from there.
+
+    Layout (version 1, integers in native byte order)::
+
+        offset  size  field
+             0     8  magic b'CNFCKPT\\n'
+             8     4  version (uint32)
+            12     4  length H of the JSON header (uint32)
+            16     H  JSON header (UTF-8): source file size and
+                      modification time, ignored line prefixes,
+                      feature version, byte order, offset, clauses
+                      read, scalar fields of the state and
+                      typecode, length and storage of every array
+                      zero padding to a multiple of 8 bytes
+                      arrays in the order of the JSON header,
+                      each padded to a multiple of 8 bytes
+
+    Arrays of literal occurences, union-find parents and sizes, clause
+    fingerprints, XOR polarities and clause polarities are stored as
+    raw items, hence a checkpoint takes about as much space as the
+    state in memory.
+
+    (C) 2015-2016, CC-0, Lukas Prokop
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import array
+import struct
+import collections
+
+from . import dimacs
+from . import collect
+from . import streaming
+from . import diskarray
+from . import fingerprints
+from .unionfind import UnionFind
+
+
+MAGIC = b'CNFCKPT\n'
+# increment whenever the layout changes
+VERSION = 1
+PREFIX = struct.Struct('=8sII')
+EXTENSION = '.checkpoint'
+
+
+def checkpoint_path(filepath):
+    """Filepath of the checkpoint of CNF file `filepath`"""
+    return filepath + EXTENSION
+
+
+def _clause_boundary(data, skip, lo=0):
+    """Return the offset after the last line in `data` terminating
+    a clause or 0. Lines ending before offset `lo` are not considered."""
+    end = data.rfind(b'\n')
+    while end >= lo:
+        start = data.rfind(b'\n', 0, end) + 1
+        line = data[start:end]
+        tokens = line.rsplit(None, 1)
+        if tokens and tokens[-1] == b'0' and not line.startswith(skip + (b'p',)):
+            return end + 1
+        end = start - 1
+    return 0
+
+
+class AlignedReader:
+    """Wraps a binary file object of DIMACS CNF content. Every read
+    returns at least `size` bytes (unless the file ends) up to the end
+    of a line terminating a clause. Hence after every block yielded by
+    :func:`cnfanalysis.dimacs.read_bulk` reading from it, all clauses
+    read are complete and `position` is the offset of the next clause.
+    """
+
+    def __init__(self, fd, ignore_lines='c%', position=0):
+        self.fd = fd
+        self.skip = dimacs._line_prefixes(ignore_lines)
+        self.position = position
+        self.rest = b''
+
+    def read(self, size=-1):
+        data = self.rest
+        while True:
+            block = self.fd.read(size)
+            checked = len(data)
+            data += block
+            cut = _clause_boundary(data, self.skip, checked) if block else len(data)
+            if cut or not block:
+                break
+        self.rest = data[cut:]
+        self.position += cut
+        return data[:cut]
+
+
+def _skip(fd, n, chunk_size=1 << 20):
+    """Advance binary file object `fd` by `n` bytes"""
+    seekable = getattr(fd, 'seekable', None)
+    if seekable is not None and seekable():
+        fd.seek(n, io.SEEK_CUR)
+        return
+    while n > 0:
+        skipped = len(fd.read(min(n, chunk_size)))
+        if skipped == 0:
+            raise ValueError('Checkpoint offset exceeds the CNF file')
+        n -= skipped
+
+
+def _encode(value, arrays):
+    """Encode an attribute of a state as JSON value. Arrays
+    are appended to `arrays` and referred to by index."""
+    def ref(data):
+        arrays.append(data)
+        return len(arrays) - 1
+
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    elif isinstance(value, list):
+        return value
+    elif isinstance(value, set):
+        return {'type': 'set', 'items': sorted(value)}
+    elif isinstance(value, (array.array, memoryview)):
+        return {'type': 'array', 'data': ref(value)}
+    elif isinstance(value, UnionFind):
+        return {'type': 'UnionFind', 'components': value.components,
+                'parent': ref(value.parent), 'size': ref(value.size)}
+    elif isinstance(value, fingerprints.FingerprintSet):
+        return {'type': 'FingerprintSet', 'count': value.count, 'slots': ref(value.slots)}
+    elif isinstance(value, streaming.ExactMean):
+        return {'type': 'ExactMean', 'count': value.count, 'total': value.total}
+    elif isinstance(value, collections.Counter):
+        # (positive literals, negative literals) -> number of clauses
+        return {'type': 'Counter', 'items': ref(array.array(
+            'Q', [v for key, count in value.items() for v in key + (count,)]))}
+    elif isinstance(value, collections.defaultdict):
+        return {'type': 'defaultdict', 'keys': ref(array.array('q', value.keys())),
+                'values': ref(array.array('q', value.values()))}
+    raise TypeError('Cannot store state attribute of type {}'.format(type(value).__name__))
+
+
+def _decode(obj, arrays):
+    """Decode a JSON value as returned by :func:`_encode`"""
+    if not isinstance(obj, dict):
+        return obj
+    typ = obj['type']
+    if typ == 'set':
+        return set(obj['items'])
+    elif typ == 'array':
+        return arrays[obj['data']]
+    elif typ == 'UnionFind':
+        uf = UnionFind.__new__(UnionFind)
+        uf.parent, uf.size = arrays[obj['parent']], arrays[obj['size']]
+        uf.components = obj['components']
+        return uf
+    elif typ == 'FingerprintSet':
+        fps = fingerprints.FingerprintSet.__new__(fingerprints.FingerprintSet)
+        fps.slots, fps.count = arrays[obj['slots']], obj['count']
+        return fps
+    elif typ == 'ExactMean':
+        mean = streaming.ExactMean()
+        mean.count, mean.total = obj['count'], obj['total']
+        return mean
+    elif typ == 'Counter':
+        items = arrays[obj['items']]
+        return collections.Counter(dict(
+            ((items[i], items[i + 1]), items[i + 2]) for i in range(0, len(items), 3)))
+    elif typ == 'defaultdict':
+        return collections.defaultdict(int, zip(arrays[obj['keys']], arrays[obj['values']]))
+    raise ValueError('Unknown state attribute type {}'.format(typ))
+
+
+def _write_padding(fd, size):
+    fd.write(bytes(-size % 8))
+
+
+def _read_array(fd, typecode, n, disk):
+    """Read `n` items of `typecode` from `fd` into an `array.array`
+    or, if `disk`, into a :mod:`cnfanalysis.diskarray`"""
+    if not disk:
+        data = array.array(typecode)
+        data.fromfile(fd, n)
+    else:
+        data = diskarray.zeros(typecode, n)
+        view = data.cast('B')
+        pos = 0
+        while pos < len(view):
+            read = fd.readinto(view[pos:])
+            if not read:
+                raise EOFError('Truncated checkpoint')
+            pos += read
+    fd.read(-data.itemsize * n % 8)
+    return data
+
+
+class Checkpoint:
+    """Checkpoint of the analysis of CNF file `sourcefile` at `path`.
+    Use :meth:`resume` to load a state stored before, :meth:`reader` to
+    read the CNF from the offset of the checkpoint and :meth:`iterate`
+    to store the state every `clauses` clauses or `seconds` seconds
+    while dispatching.
+
+    :param path:            filepath of the checkpoint
+    :type path:             str
+    :param sourcefile:      filepath of the CNF file
+    :type sourcefile:       str
+    :param ignore_lines:    prefixes of lines to ignore
+    :type ignore_lines:     str
+    :param clauses:         number of clauses between checkpoints or None
+    :type clauses:          int
+    :param seconds:         seconds between checkpoints or None
+    :type seconds:          float
+    """
+
+    def __init__(self, path, sourcefile, ignore_lines='c%', clauses=None, seconds=None):
+        self.path = path
+        self.sourcefile = sourcefile
+        self.ignore_lines = ignore_lines
+        self.every_clauses = clauses
+        self.every_seconds = seconds
+        self.offset = 0
+        self.clauses = 0
+        self.aligned = None
+
+    def _source(self):
+        stat = os.stat(self.sourcefile)
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def _header(self, state, arrays):
+        return {
+            'source': self._source(),
+            'ignore_lines': ''.join(sorted(set(self.ignore_lines))),
+            'features_version': collect.FEATURES_VERSION,
+            'byteorder': sys.byteorder,
+            'offset': self.offset,
+            'clauses': self.clauses,
+            'state': dict((name, _encode(value, arrays)) for name, value in vars(state).items())
+        }
+
+    def save(self, state):
+        """Store `state` after the clauses read so far.
+        The checkpoint is replaced atomically."""
+        arrays = []
+        header = self._header(state, arrays)
+        # memoryviews are arrays in temporary files, see cnfanalysis.diskarray
+        header['arrays'] = [[data.format, len(data), True] if isinstance(data, memoryview)
+                            else [data.typecode, len(data), False] for data in arrays]
+        encoded = json.dumps(header).encode('utf-8')
+
+        tmppath = self.path + '.tmp'
+        with open(tmppath, 'wb') as fd:
+            fd.write(PREFIX.pack(MAGIC, VERSION, len(encoded)))
+            fd.write(encoded)
+            _write_padding(fd, PREFIX.size + len(encoded))
+            for data in arrays:
+                fd.write(data)
+                _write_padding(fd, data.itemsize * len(data))
+        os.replace(tmppath, self.path)
+
+    def resume(self, groups, memory_budget=None):
+        """Load the state of the checkpoint if it exists and was
+        stored for the same CNF file (by size and modification time),
+        prefixes of lines ignored, feature groups and feature version.
+        Afterwards :meth:`reader` continues at its offset.
+
+        :param groups:          feature groups of the analysis
+        :type groups:           set
+        :param memory_budget:   memory budget of the state in bytes or None
+        :type memory_budget:    int
+        :return:                the state or None
+        :rtype:                 cnfanalysis.collect.State
+        """
+        try:
+            fd = open(self.path, 'rb')
+        except FileNotFoundError:
+            return None
+        with fd:
+            magic, version, length = PREFIX.unpack(fd.read(PREFIX.size))
+            if magic != MAGIC or version != VERSION:
+                return None
+            header = json.loads(fd.read(length).decode('utf-8'))
+            fd.read(-(PREFIX.size + length) % 8)
+            if (header['source'] != self._source() or header['byteorder'] != sys.byteorder
+                    or header['ignore_lines'] != ''.join(sorted(set(self.ignore_lines)))
+                    or header['features_version'] != collect.FEATURES_VERSION
+                    or set(header['state']['groups']['items']) != set(groups)):
+                return None
+
+            fields = header['state']
+            arrays = [_read_array(fd, typecode, n, disk) for typecode, n, disk in header['arrays']]
+
+        state = collect.State(groups, memory_budget)
+        for name, obj in fields.items():
+            setattr(state, name, _decode(obj, arrays))
+        state.memory_budget = memory_budget
+        self.offset, self.clauses = header['offset'], header['clauses']
+        return state
+
+    def reader(self, fd):
+        """Skip the bytes of `fd` read before the checkpoint and return
+        a file object to pass to :func:`cnfanalysis.dimacs.read_bulk`.
+        If the checkpoint was resumed, `read_bulk` must be given the
+        header of the state."""
+        _skip(fd, self.offset)
+        self.aligned = AlignedReader(fd, self.ignore_lines, self.offset)
+        return self.aligned
+
+    def iterate(self, reader, state):
+        """Yield the values of `reader` reading from :meth:`reader`.
+        After a block of clauses was dispatched into `state`, store a
+        checkpoint if `clauses` clauses or `seconds` seconds passed
+        since the last one."""
+        iterator = iter(reader)
+        yield next(iterator)
+        yield next(iterator)
+        saved_clauses, saved_at = self.clauses, time.monotonic()
+        for block in iterator:
+            yield block
+            self.clauses += len(block[1]) - 1
+            self.offset = self.aligned.position
+            if ((self.every_clauses and self.clauses - saved_clauses >= self.every_clauses) or
+                    (self.every_seconds and time.monotonic() - saved_at >= self.every_seconds)):
+                self.save(state)
+                saved_clauses, saved_at = self.clauses, time.monotonic()
+
+    def remove(self):
+        """Remove the checkpoint after the analysis finished"""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -9,28 +9,195 @@
     (C) 2015-2016, CC-0, Lukas Prokop
 """
 
-import math
+import array
+import fnmatch
+import operator
+import itertools
 import statistics
 import collections
-import python_algorithms.basic.union_find
+
+from . import streaming
+from . import diskarray
+from . import fingerprints
+from .unionfind import UnionFind
+
+
+GROUPS = ('linear', 'components', 'expensive', 'frequency')
+# increment whenever the value of any feature changes for some CNF
+FEATURES_VERSION = 2
+
+
+def _stat_names(prefix, spec='aimsd'):
+    """Names of features computed by :func:`cnfanalysis.streaming.describe`"""
+    suffixes = {'a': 'largest', 'i': 'smallest', 'm': 'mean',
+                's': 'sd', 'd': 'median', 'e': 'entropy'}
+    return tuple('{}_{}'.format(prefix, suffixes[s]) for s in spec)
+
+
+def _bucket_names(prefix):
+    """Names of frequency bucket features"""
+    return tuple('{}_{}_to_{}'.format(prefix, begin, begin + 5) for begin in range(0, 100, 5))
+
+
+FEATURE_GROUPS = {
+    'linear': (
+        'nbvars', 'nbclauses', 'clauses_count', 'literals_count',
+        'positive_unit_clause_count', 'negative_unit_clause_count',
+        'two_literals_clause_count', 'tautological_literals_count',
+        'true_trivial', 'false_trivial',
+        'definite_clauses_count', 'goal_clauses_count'
+    ),
+    'components': (
+        'connected_literal_components_count',
+        'connected_variable_components_count'
+    ),
+    'expensive': (
+        'positive_literals_count', 'clause_variables_sd_mean',
+        'positive_negative_literals_in_clause_ratio_entropy',
+        'positive_negative_literals_in_clause_ratio_mean',
+        'positive_negative_literals_in_clause_ratio_stdev',
+        'clauses_unique_count', 'xor2_count', 'xor2_equivalence_count'
+    ) + _stat_names('clauses_length', 'aimsd')
+      + _stat_names('positive_literals_in_clause', 'aimsd')
+      + _stat_names('negative_literals_in_clause', 'aim'),
+    'frequency': (
+        'variables_used_count', 'variables_largest', 'variables_smallest',
+        'existential_literals_count', 'existential_positive_literals_count',
+        'literals_occurence_one_count', 'full_var_occurence_count'
+    ) + _stat_names('literals_frequency', 'aimsde')
+      + _stat_names('variables_frequency', 'aimsde')
+      + _bucket_names('literals_frequency')
+      + _bucket_names('variables_frequency')
+}
+
+
+def feature_type(name):
+    """Return the type of values of feature `name`: bool, int or float.
+    Integral means and medians are of type float as well.
+    """
+    if name in ('true_trivial', 'false_trivial'):
+        return bool
+    if name.endswith(('_mean', '_sd', '_stdev', '_median', '_entropy')):
+        return float
+    if name.startswith(('literals_frequency_', 'variables_frequency_')) \
+            and name not in _bucket_names('literals_frequency') + _bucket_names('variables_frequency'):
+        return float
+    return int
+
+
+def _selected(name, selection):
+    """Is feature `name` matched by any name or pattern of `selection`?"""
+    return any(fnmatch.fnmatchcase(name, pattern) for pattern in selection)
+
+
+def feature_groups(selection=None):
+    """Determine which groups of features have to be computed
+    to provide the features in `selection`.
+
+    :param selection:   feature names, fnmatch patterns like
+                        'clauses_length_*' or names of groups
+                        ('linear', 'components', 'expensive', 'frequency').
+                        None selects all features.
+    :type selection:    [str]
+    :return:            names of groups to compute
+    :rtype:             set
+    """
+    if selection is None:
+        return set(GROUPS)
+
+    groups = set()
+    for pattern in selection:
+        if pattern in FEATURE_GROUPS:
+            groups.add(pattern)
+            continue
+        matched = {g for g in GROUPS
+                   if any(fnmatch.fnmatchcase(name, pattern) for name in FEATURE_GROUPS[g])}
+        if not matched:
+            raise ValueError('No feature matches "{}"'.format(pattern))
+        groups |= matched
+    return groups
+
+
+def select_features(features, selection=None):
+    """Restrict a dictionary of `features` to the ones in `selection`.
+
+    :param features:    A dictionary associating feature name to its value
+    :type features:     dict
+    :param selection:   feature names, fnmatch patterns or names of groups.
+                        None selects all features.
+    :type selection:    [str]
+    :return:            A dictionary with the selected features only
+    :rtype:             dict
+    """
+    if selection is None:
+        return features
+    patterns = []
+    for pattern in selection:
+        patterns.extend(FEATURE_GROUPS.get(pattern, (pattern,)))
+    return dict((k, v) for k, v in features.items() if _selected(k, patterns))
+
+
+# bytes per binary clause retained for XOR detection (entry of a dict)
+XOR2_ENTRY_SIZE = 100
+# bytes per clause retained as fingerprint (at least 3/8 load factor, resizing)
+FINGERPRINT_ENTRY_SIZE = 32
+# features derived from clauses retained in memory,
+# skipped if the memory budget of a state is exceeded
+CLAUSE_RETAINING_FEATURES = ('clauses_unique_count', 'xor2_count', 'xor2_equivalence_count')
+# number of variables processed at once when computing frequency features
+FREQUENCY_CHUNK_SIZE = 1 << 16
+
+
+def collectors(groups=GROUPS):
+    """Return the update functions to dispatch for the given feature `groups`.
+
+    :param groups:  names of feature groups to compute
+    :type groups:   set
+    :return:        header, clause and literal update functions
+    :rtype:         ([Callable], [Callable], [Callable])
+    """
+    header_fns = [header_features]
+    clause_fns, literal_fns = [], []
+    for group in GROUPS:
+        if group in groups:
+            header, clause, literal = COLLECTORS[group]
+            header_fns.extend(header)
+            clause_fns.extend(clause)
+            literal_fns.extend(literal)
+    return header_fns, clause_fns, literal_fns
 
 
 class State:
     """Represents an intermediate state
-    when computing CNF features
+    when computing CNF features.
+
+    If the memory projected for the header of the CNF exceeds
+    `memory_budget` bytes, arrays of literals and variables are
+    stored in temporary files (see :mod:`cnfanalysis.diskarray`)
+    and if this does not suffice, clauses are not retained and
+    features depending on them are skipped (see :meth:`plan_memory`).
+
+    :param groups:          names of feature groups to compute
+    :type groups:           set
+    :param memory_budget:   memory available for this state in bytes or None
+    :type memory_budget:    int
     """
 
-    def __init__(self):
+    def __init__(self, groups=GROUPS, memory_budget=None):
+        self.groups = set(groups)
+        self.memory_budget = memory_budget
+        self.disk_backed = False
+        self.retain_clauses = True
+        self.skipped_features = []
         self.nbvars = 0
         self.nbclauses = 0
         self.clauses_count = 0
         self.literals_count = 0
-        self.literals = set()
-        self.clause_lengths = []
-        self.positive_literals_in_clause = []
-        self.negative_literals_in_clause = []
-        self.literals_occurences = collections.defaultdict(int)
-        self.clause_variables_sd = []
+        # (positive literals, negative literals) of a clause -> number of clauses
+        self.clause_polarities = collections.Counter()
+        # occurences of literal `lit` at index ``lit + nbvars``
+        self.literals_occurences = array.array('Q')
+        self.clause_variables_sd = streaming.ExactMean()
         self.positive_unit_clause_count = 0
         self.negative_unit_clause_count = 0
         self.two_literals_clause_count = 0
@@ -39,165 +206,446 @@ class State:
         self.connected_variable_components_count = 0
         self.true_trivial = True
         self.false_trivial = True
+        # variable pair -> bitmask of polarities of binary clauses, see _xor2_update
         self.xor2_detect = collections.defaultdict(int)
+        self.clause_fingerprints = fingerprints.FingerprintSet()
         self.definite_clause_count = 0
         self.goal_clause_count = 0
 
+    def projected_memory(self, nbvars, nbclauses):
+        """Project the memory required by the data structures of this
+        state for a CNF with the given header. Clauses retained are
+        projected for the worst case that every clause is binary.
+
+        :return:        bytes in memory, bytes in memory or temporary files
+                        for arrays and bytes for clauses retained
+        :rtype:         (int, int, int)
+        """
+        arrays = 0
+        if 'components' in self.groups:
+            itemsize = 4 if 2 * nbvars + 1 < 2 ** 31 else 8
+            # parents and sizes of literal and variable union-find structures
+            arrays += 2 * itemsize * (3 * nbvars + 2)
+        if 'frequency' in self.groups:
+            arrays += 8 * (2 * nbvars + 1)
+        retained = 0
+        if 'expensive' in self.groups and self.retain_clauses:
+            retained = (XOR2_ENTRY_SIZE + FINGERPRINT_ENTRY_SIZE) * nbclauses
+        in_memory = retained + (0 if self.disk_backed else arrays)
+        return in_memory, arrays, retained
+
+    def plan_memory(self, nbvars, nbclauses):
+        """Degrade to strategies with less memory until the projected
+        memory fits into the memory budget: first store arrays
+        in temporary files, then do not retain clauses and skip
+        :data:`CLAUSE_RETAINING_FEATURES`.
+        Has to be called before the arrays are allocated.
+
+        :return:        projected bytes in memory afterwards
+        :rtype:         int
+        """
+        in_memory, arrays, retained = self.projected_memory(nbvars, nbclauses)
+        if self.memory_budget is None or in_memory <= self.memory_budget:
+            return in_memory
+        if arrays:
+            self.disk_backed = True
+            in_memory -= arrays
+        if in_memory > self.memory_budget and retained:
+            self.retain_clauses = False
+            self.skipped_features.extend(CLAUSE_RETAINING_FEATURES)
+            in_memory -= retained
+        return in_memory
+
+    def merge(self, other):
+        """Merge the state of another part of the same CNF into this one.
+        Both states must be created for the same groups and have seen
+        the same header. Afterwards this state equals the state
+        after dispatching the clauses of both parts.
+
+        :param other:   state of another set of clauses of the same CNF
+        :type other:    State
+        """
+        if (self.nbvars, self.nbclauses) != (other.nbvars, other.nbclauses):
+            raise ValueError('Cannot merge states of CNFs with different headers')
+        self.retain_clauses = self.retain_clauses and other.retain_clauses
+        self.skipped_features.extend(name for name in other.skipped_features
+                                     if name not in self.skipped_features)
+        if 'linear' in self.groups:
+            self.clauses_count += other.clauses_count
+            if self.clauses_count > self.nbclauses:
+                raise ValueError("Expected {} clauses, but got more".format(self.nbclauses))
+            self.literals_count += other.literals_count
+            self.positive_unit_clause_count += other.positive_unit_clause_count
+            self.negative_unit_clause_count += other.negative_unit_clause_count
+            self.two_literals_clause_count += other.two_literals_clause_count
+            self.tautological_literals_count += other.tautological_literals_count
+            self.definite_clause_count += other.definite_clause_count
+            self.goal_clause_count += other.goal_clause_count
+            self.true_trivial = self.true_trivial and other.true_trivial
+            self.false_trivial = self.false_trivial and other.false_trivial
+        if 'components' in self.groups:
+            self.connected_literal_components.merge(other.connected_literal_components)
+            self.connected_variable_components.merge(other.connected_variable_components)
+        if 'expensive' in self.groups:
+            self.clause_polarities.update(other.clause_polarities)
+            self.clause_variables_sd.merge(other.clause_variables_sd)
+            for ref, id in other.xor2_detect.items():
+                self.xor2_detect[ref] |= id
+            self.clause_fingerprints.update(other.clause_fingerprints)
+        if 'frequency' in self.groups:
+            self.literals_occurences = array.array('Q', map(
+                operator.add, self.literals_occurences, other.literals_occurences))
+
     def finalize(self):
         """After dispatching the last literal, return a dictionary of
-        features with their values.
+        features with their values. Only features of the groups
+        this state was created for are computed.
 
         :return:        A dictionary associating feature name to its value
         :rtype:         dict
         """
-        # TODO: support full_var_occurence
-        # TODO: support clauses_unique_count
-        # TODO: support xor2_detect
-        variables_used = set(map(abs, self.literals))
-        existential_lits, existential_pos_lits = 0, 0
-        literals_occurence_one_count = 0
-        for lit, freq in self.literals_occurences.items():
-            if freq == 1:
-                literals_occurence_one_count += 1
-            if freq == 1 and self.literals_occurences.get(-lit, 0) == 0:
-                existential_lits += 1
-                if lit > 0:
-                    existential_pos_lits += 1
-
-        assert len(self.positive_literals_in_clause) == len(self.negative_literals_in_clause)
-        pnlicre = 0.0
-        pnlicrm = []
-        for pos, neg in zip(self.positive_literals_in_clause, self.negative_literals_in_clause):
-            # 0% = none is positive      100% = all are positive
-            ratio = 1.0 * pos / (pos + neg)
-            if ratio != 0.0:
-                pnlicre += ratio * math.log(ratio, 2)
-            pnlicrm.append(ratio)
-        pnlicrs = statistics.pstdev(pnlicrm)
-        pnlicrm = statistics.mean(pnlicrm)
-
-        # Assumption: number of clauses with literal X ~ number of occurences of X
-        lit_freq, lit_freq_valid = [], True
-        var_freq, var_freq_valid = [], True
-        lit_freq_cat = [0] * 20
-        var_freq_cat = [0] * 20
-        for lit in range(-max(variables_used), max(variables_used) + 1):
-            if lit == 0:
-                continue
-            freq = 1.0 * self.literals_occurences[lit] / self.nbclauses
-            if freq > 1.0:
-                lit_freq_valid = False
-            lit_freq.append(freq)
-            lit_freq_cat[int((100 * freq) // 5) if freq < 1.0 else 19] += 1
-        for var in range(1, max(variables_used) + 1):
-            p = self.literals_occurences[var]
-            n = self.literals_occurences[-var]
-            freq = 1.0 * (p + n) / self.nbclauses
-            if freq > 1.0:
-                var_freq_valid = False
-            var_freq.append(freq)
-            var_freq_cat[int((100 * freq) // 5) if freq < 1.0 else 19] += 1
+        features = {}
+        if 'linear' in self.groups:
+            features.update(self._linear_features())
+        if 'components' in self.groups:
+            features.update(self._component_features())
+        if 'expensive' in self.groups:
+            features.update(self._expensive_features())
+        if 'frequency' in self.groups:
+            features.update(self._frequency_features())
+        return features
 
-        features = {
+    def _linear_features(self):
+        return {
             'nbvars': self.nbvars,
             'nbclauses': self.nbclauses,
             'clauses_count': self.clauses_count,
             'literals_count': self.literals_count,
-            'variables_used_count': len(variables_used),
-            'variables_largest': max(variables_used),
-            'variables_smallest': min(variables_used),
-            'positive_literals_count': sum(self.positive_literals_in_clause),
-            'positive_negative_literals_in_clause_ratio_entropy': -pnlicre,
-            'positive_negative_literals_in_clause_ratio_mean': pnlicrm,
-            'positive_negative_literals_in_clause_ratio_stdev': pnlicrs,
-            'existential_literals_count': existential_lits,
-            'existential_positive_literals_count': existential_pos_lits,
-            'clause_variables_sd_mean': statistics.mean(self.clause_variables_sd),
             'positive_unit_clause_count': self.positive_unit_clause_count,
             'negative_unit_clause_count': self.negative_unit_clause_count,
             'two_literals_clause_count': self.two_literals_clause_count,
             'tautological_literals_count': self.tautological_literals_count,
-            # Remark: count - 1, because "0" will not be connected to anyone
-            'connected_literal_components_count': self.connected_literal_components.count() - 1,
-            'connected_variable_components_count': self.connected_variable_components.count() - 1,
             'true_trivial': self.true_trivial,
             'false_trivial': self.false_trivial,
-            'literals_occurence_one_count': literals_occurence_one_count,
             'definite_clauses_count': self.definite_clause_count,
             'goal_clauses_count': self.goal_clause_count
         }
-        features.update(self._stat(self.clause_lengths,
-                                   'clauses_length', 'aimsd'))
-        features.update(self._stat(self.positive_literals_in_clause,
-                                   'positive_literals_in_clause', 'aimsd'))
-        features.update(self._stat(self.negative_literals_in_clause,
-                                   'negative_literals_in_clause', 'aim'))
-        if lit_freq_valid:
-            features.update(self._stat(lit_freq, 'literals_frequency', 'aimsde'))
-        if var_freq_valid:
-            features.update(self._stat(var_freq, 'variables_frequency', 'aimsde'))
-        for begin, end in zip(range(0, 100, 5), range(5, 105, 5)):
-            if lit_freq_valid and lit_freq_cat[begin // 5] != 0.0:
-                features['literals_frequency_{}_to_{}'.format(begin, end)] = lit_freq_cat[begin // 5]
-            if var_freq_valid and var_freq_cat[begin // 5] != 0.0:
-                features['variables_frequency_{}_to_{}'.format(begin, end)] = var_freq_cat[begin // 5]
+
+    def _component_features(self):
+        # Remark: count - 1, because literal/variable "0" will not be connected to anyone
+        return {
+            'connected_literal_components_count': self.connected_literal_components.count() - 1,
+            'connected_variable_components_count': self.connected_variable_components.count() - 1
+        }
+
+    def _expensive_features(self):
+        clause_lengths = collections.Counter()
+        positive_literals_in_clause = collections.Counter()
+        negative_literals_in_clause = collections.Counter()
+        ratios = collections.Counter()
+        for (pos, neg), count in self.clause_polarities.items():
+            clause_lengths[pos + neg] += count
+            positive_literals_in_clause[pos] += count
+            negative_literals_in_clause[neg] += count
+            # 0% = none is positive      100% = all are positive
+            ratios[1.0 * pos / (pos + neg)] += count
+
+        features = {
+            'positive_literals_count': sum(p * c for p, c in positive_literals_in_clause.items()),
+            'positive_negative_literals_in_clause_ratio_entropy': -streaming.entropy_sum(ratios),
+            'positive_negative_literals_in_clause_ratio_mean': streaming.mean(ratios),
+            'positive_negative_literals_in_clause_ratio_stdev': streaming.pstdev(ratios),
+            'clause_variables_sd_mean': self.clause_variables_sd.mean()
+        }
+        if self.retain_clauses:
+            polarities = self.xor2_detect.values()
+            features['clauses_unique_count'] = len(self.clause_fingerprints)
+            # (x | y) & (-x | -y), i.e. x xor y
+            features['xor2_count'] = sum(1 for bits in polarities if bits & 9 == 9)
+            # (x | -y) & (-x | y), i.e. x == y
+            features['xor2_equivalence_count'] = sum(1 for bits in polarities if bits & 6 == 6)
+        features.update(streaming.describe(clause_lengths,
+                                           'clauses_length', 'aimsd'))
+        features.update(streaming.describe(positive_literals_in_clause,
+                                           'positive_literals_in_clause', 'aimsd'))
+        features.update(streaming.describe(negative_literals_in_clause,
+                                           'negative_literals_in_clause', 'aim'))
+        return features
+
+    def _frequency_features(self):
+        occurences = self.literals_occurences
+        nbvars = self.nbvars
+        unused = 0
+        smallest = largest = None
+        existential_pos_lits = existential_neg_lits = 0
+        occurence_one = 0
+        full_occurence = 0
+        lit_occ = collections.Counter()
+        var_occ = collections.Counter()
+
+        # variables are processed chunkwise, hence memory does not grow
+        # with nbvars if the occurences are stored in a temporary file
+        for begin in range(1, nbvars + 1, FREQUENCY_CHUNK_SIZE):
+            end = min(begin + FREQUENCY_CHUNK_SIZE, nbvars + 1)
+            # occurences of literals -begin, ..., -(end - 1) and begin, ..., end - 1
+            negatives = array.array('Q', occurences[nbvars - end + 1:nbvars - begin + 1])
+            negatives.reverse()
+            positives = array.array('Q', occurences[nbvars + begin:nbvars + end])
+            variable_occurences = array.array('Q', map(operator.add, positives, negatives))
+
+            chunk_unused = variable_occurences.count(0)
+            unused += chunk_unused
+            if chunk_unused < len(variable_occurences):
+                if smallest is None:
+                    smallest = begin + next(i for i, occ in enumerate(variable_occurences) if occ)
+                largest = end - 1 - next(i for i, occ in enumerate(reversed(variable_occurences))
+                                         if occ)
+            existential_pos_lits += sum(map(operator.and_, map((1).__eq__, positives),
+                                            map((0).__eq__, negatives)))
+            existential_neg_lits += sum(map(operator.and_, map((1).__eq__, negatives),
+                                            map((0).__eq__, positives)))
+            occurence_one += positives.count(1) + negatives.count(1)
+            # variables occuring positively and negatively
+            full_occurence += sum(map(operator.and_, map(bool, positives), map(bool, negatives)))
+            lit_occ.update(negatives)
+            lit_occ.update(positives)
+            var_occ.update(variable_occurences)
+
+        if unused == nbvars:
+            raise ValueError('Cannot compute frequency features without any literal')
+        # only variables up to the largest one used are considered
+        lit_occ[0] -= 2 * (nbvars - largest)
+        var_occ[0] -= nbvars - largest
+        lit_occ, var_occ = +lit_occ, +var_occ
+
+        features = {
+            'variables_used_count': nbvars - unused,
+            'variables_largest': largest,
+            'variables_smallest': smallest,
+            'existential_literals_count': existential_pos_lits + existential_neg_lits,
+            'existential_positive_literals_count': existential_pos_lits,
+            'literals_occurence_one_count': occurence_one,
+            'full_var_occurence_count': full_occurence
+        }
+
+        # Assumption: number of clauses with literal X ~ number of occurences of X
+        for name, occ in [('literals_frequency', lit_occ), ('variables_frequency', var_occ)]:
+            freq = collections.Counter()
+            freq_cat = [0] * 20
+            for count, vars_count in occ.items():
+                f = 1.0 * count / self.nbclauses
+                freq[f] += vars_count
+                freq_cat[int((100 * f) // 5) if f < 1.0 else 19] += vars_count
+            if max(freq) > 1.0:
+                continue
+            features.update(streaming.describe(freq, name, 'aimsde'))
+            for begin, end in zip(range(0, 100, 5), range(5, 105, 5)):
+                if freq_cat[begin // 5] != 0:
+                    features['{}_{}_to_{}'.format(name, begin, end)] = freq_cat[begin // 5]
 
         return features
 
-    @staticmethod
-    def _stat(nums, prefix, spec='aimsd'):
-        """Compute general statistics for a given list of numbers.
-
-        :param nums:        a list of numbers
-        :type nums:         int or float
-        :param prefix:      string prefix to append to dict keys returned
-        :type prefix:       str
-        :param spec:        features to compute, a=max, i=min, m=mean,
-                            s=stdev, d=median, e=entropy
-        :type spec:         str
-        :return:            dictionary of features computed
-        :rtype:             dict
+
+def _pstdev(n, s1, s2):
+    """Population standard deviation of `n` integers given their
+    sum `s1` and sum of squares `s2`. Equals `statistics.pstdev`,
+    but is computed with exact integer arithmetic.
+    """
+    if n < 1:
+        raise statistics.StatisticsError('pstdev requires at least one data point')
+    return streaming.sqrt_frac(n * s2 - s1 * s1, n * n)
+
+
+class VectorizedState(State):
+    """Computes the same features as :class:`State` updated by the
+    collectors of this module, but consumes an entire
+    :class:`cnfanalysis.dimacs.CNF` at once. Per-clause and per-literal
+    values are derived with batched operations over its literal buffer
+    and clause offsets instead of one function call per clause and literal.
+    """
+
+    def consume(self, cnf):
+        """Update state with all clauses of `cnf`.
+
+        :param cnf:     CNF in compressed sparse row layout
+        :type cnf:      cnfanalysis.dimacs.CNF
         """
-        if not nums:
-            return {}
-
-        d = {}
-        if 'a' in spec:
-            d[prefix + '_largest'] = max(nums)
-        if 'i' in spec:
-            d[prefix + '_smallest'] = min(nums)
-        if 'm' in spec:
-            d[prefix + '_mean'] = statistics.mean(nums)
-        if 's' in spec:
-            d[prefix + '_sd'] = statistics.pstdev(nums)
-        if 'd' in spec:
-            d[prefix + '_median'] = statistics.median(nums)
-        if 'e' in spec:
-            d[prefix + '_entropy'] = 0.0
-            for val in nums:
-                if val <= 0.0:
-                    continue
-                d[prefix + '_entropy'] += val * math.log(val, 2)
-            d[prefix + '_entropy'] = -d[prefix + '_entropy']
-        return d
+        header_features(self, cnf.nbvars, cnf.nbclauses)
+        literals, offsets = cnf.literals, cnf.offsets
+        begins, ends = offsets[:-1], offsets[1:]
+
+        def per_clause(values):
+            """Sum `values` (one per literal) per clause using prefix sums"""
+            prefix = array.array('q', [0])
+            prefix.extend(itertools.accumulate(values))
+            return array.array('q', map(operator.sub, map(prefix.__getitem__, ends),
+                                        map(prefix.__getitem__, begins)))
+
+        # per-clause values are accumulated in arrays, not lists of int objects
+        lengths = array.array('q', map(operator.sub, ends, begins))
+        if self.groups & {'linear', 'expensive'}:
+            positives = per_clause(map((0).__lt__, literals))
+            negatives = array.array('q', map(operator.sub, lengths, positives))
+
+        if 'linear' in self.groups:
+            self.clauses_count = len(cnf)
+            if self.clauses_count > self.nbclauses:
+                raise ValueError("Expected {} clauses, but got more".format(self.nbclauses))
+            self.literals_count = len(literals)
+            if literals and not (-self.nbvars <= min(literals) and max(literals) <= self.nbvars):
+                literal = next(l for l in literals if not (-self.nbvars <= l <= self.nbvars))
+                errmsg = "Literal {} not in [-{}, {}] derived from nbvars"
+                raise ValueError(errmsg.format(literal, self.nbvars, self.nbvars))
+
+            units = array.array('i', map(literals.__getitem__,
+                                         itertools.compress(begins, map((1).__eq__, lengths))))
+            self.positive_unit_clause_count = sum(map((0).__lt__, units))
+            self.negative_unit_clause_count = len(units) - self.positive_unit_clause_count
+            self.two_literals_clause_count = lengths.count(2)
+            self.definite_clause_count = positives.count(1)
+            self.goal_clause_count = positives.count(0)
+            self.true_trivial = 0 not in positives
+            self.false_trivial = 0 not in negatives
+
+        if 'expensive' in self.groups:
+            variables = array.array('q', map(abs, literals))
+            variables_sums = per_clause(variables)
+            variables_squares = per_clause(map(operator.mul, variables, variables))
+            del variables
+
+            self.clause_polarities.update(zip(positives, negatives))
+            self.clause_variables_sd.update(map(_pstdev, lengths, variables_sums, variables_squares))
+
+        if 'frequency' in self.groups:
+            frequency_header_features(self, cnf.nbvars, cnf.nbclauses)
+            occurences = self.literals_occurences
+            for literal, count in collections.Counter(literals).items():
+                occurences[literal + self.nbvars] = count
+
+        if 'components' in self.groups:
+            component_header_features(self, cnf.nbvars, cnf.nbclauses)
+            # connect every literal with the first literal of its clause
+            firsts = map(literals.__getitem__, itertools.compress(begins, lengths))
+            heads = array.array('i', itertools.chain.from_iterable(
+                map(itertools.repeat, firsts, filter(None, lengths))))
+            self.connected_literal_components.union_pairs(
+                map(self.nbvars.__add__, heads), map(self.nbvars.__add__, literals))
+            self.connected_variable_components.union_pairs(map(abs, heads), map(abs, literals))
+            del heads
+
+        retain = 'expensive' in self.groups and self.retain_clauses
+        if not ('linear' in self.groups or retain):
+            return
+        view = memoryview(literals)
+        for begin, end in zip(begins, ends):
+            clause = view[begin:end]
+            if retain:
+                distinct = fingerprints.canonical(clause)
+                self.clause_fingerprints.add(
+                    fingerprints.canonical_fingerprint(distinct, self.nbvars))
+                if len(clause) == 2 and len(distinct) == 2:
+                    _xor2_update(self, distinct)
+            if 'linear' in self.groups:
+                self.tautological_literals_count += _tautological_count(clause)
+
+
+def _tautological_count(clause):
+    """Number of literals of `clause` whose complement is in `clause` too
+    (repeated literals are counted repeatedly), halved"""
+    if len(clause) < 2 or len(set(map(abs, clause))) == len(clause):
+        return 0
+    literals = set(clause)
+    return sum(1 for lit in clause if -lit in literals) // 2
+
+
+class NormalizedClause:
+    """View of a clause computed once per clause by the dispatch functions
+    and passed to every clause update function. It behaves like the
+    sequence of literals of the clause as read and additionally provides:
+
+    `literals`
+      the literals as read
+    `positives`, `negatives`
+      number of positive and negative literals (repeated literals
+      are counted repeatedly)
+    `tautological`
+      number of pairs of complementary literals, see
+      :func:`_tautological_count`
+    `distinct`
+      the distinct literals sorted by variable, see
+      :func:`cnfanalysis.fingerprints.canonical`
+    `duplicates`
+      whether some literal occurs repeatedly
+
+    `tautological` and `distinct` are computed on first access only,
+    hence collectors not using them do not pay for them.
+    """
+
+    __slots__ = ('literals', 'positives', 'negatives', '_tautological', '_distinct')
+
+    def __init__(self, literals):
+        self.literals = literals
+        self.positives = sum(map((0).__lt__, literals))
+        self.negatives = len(literals) - self.positives
+        self._tautological = None
+        self._distinct = None
+
+    @property
+    def tautological(self):
+        if self._tautological is None:
+            self._tautological = _tautological_count(self.literals)
+        return self._tautological
+
+    @property
+    def distinct(self):
+        if self._distinct is None:
+            self._distinct = fingerprints.canonical(self.literals)
+        return self._distinct
+
+    @property
+    def duplicates(self):
+        return len(self.distinct) != len(self.literals)
+
+    def __len__(self):
+        return len(self.literals)
+
+    def __iter__(self):
+        return iter(self.literals)
+
+    def __getitem__(self, index):
+        return self.literals[index]
+
+    def __repr__(self):
+        return 'NormalizedClause({})'.format(list(self.literals))
 
 
 def header_features(state, nbvars, nbclauses):
-    """Evaluate features based on CNF header"""
+    """Evaluate features based on CNF header and
+    choose strategies fitting into the memory budget"""
     state.nbvars = nbvars
     state.nbclauses = nbclauses
+    state.plan_memory(nbvars, nbclauses)
+
 
-    state.connected_literal_components = python_algorithms.basic.union_find.UF(2 * nbvars + 1)
-    state.connected_variable_components = python_algorithms.basic.union_find.UF(nbvars + 1)
+def component_header_features(state, nbvars, nbclauses):
+    """Set up connected components based on CNF header.
+    Literal `lit` is represented by element ``lit + nbvars``,
+    variable `var` by element `var`.
+    """
+    state.connected_literal_components = UnionFind(2 * nbvars + 1, state.disk_backed)
+    state.connected_variable_components = UnionFind(nbvars + 1, state.disk_backed)
 
 
-def _poseq(n):
-    """map given integer to natural number"""
-    return -2*n if n < 0 else 2*n - 1
+def frequency_header_features(state, nbvars, nbclauses):
+    """Allocate literal occurence counters based on CNF header"""
+    if state.disk_backed:
+        state.literals_occurences = diskarray.zeros('Q', 2 * nbvars + 1)
+    else:
+        state.literals_occurences = array.array('Q', [0]) * (2 * nbvars + 1)
 
 
 def linear_clause_features(state, clause):
-    """Linear computable clause features"""
+    """Linear computable clause features of a :class:`NormalizedClause`"""
     state.clauses_count += 1
     if state.clauses_count > state.nbclauses:
         raise ValueError("Expected {} clauses, but got more".format(state.nbclauses))
@@ -208,27 +656,21 @@ def linear_clause_features(state, clause):
     if len(clause) == 2:
         state.two_literals_clause_count += 1
 
-    taut = 0
-    for lit in clause:
-        if -lit in clause:
-            taut += 1
-    assert taut % 2 == 0
-    state.tautological_literals_count += taut // 2
-
-    for lit in clause[1:]:
-        state.connected_literal_components.union(_poseq(clause[0]), _poseq(lit))
-        state.connected_variable_components.union(abs(clause[0]), abs(lit))
+    state.tautological_literals_count += clause.tautological
 
-    pos = len(list(filter(lambda v: v > 0, clause)))
-    neg = len(list(filter(lambda v: v < 0, clause)))
-    if neg == 0:
+    if clause.negatives == 0:
         state.false_trivial = False
-    if pos == 0:
+    if clause.positives == 0:
         state.true_trivial = False
-    if pos == 1:
-        state.definite_clause_count += 1
-    if pos == 0:
         state.goal_clause_count += 1
+    if clause.positives == 1:
+        state.definite_clause_count += 1
+
+
+def component_clause_features(state, clause):
+    """Connect all literals and variables of a :class:`NormalizedClause`"""
+    state.connected_literal_components.union_many(map(state.nbvars.__add__, clause.literals))
+    state.connected_variable_components.union_many(map(abs, clause.literals))
 
 
 def linear_literal_features(state, literal):
@@ -240,33 +682,53 @@ def linear_literal_features(state, literal):
         raise ValueError(errmsg.format(literal, state.nbvars, state.nbvars))
 
 
+def _xor2_update(state, distinct):
+    """Record the polarities of a binary clause with two `distinct` literals
+    sorted by variable for its pair of variables ``(x, y)`` with
+    ``x < y`` as bit ``1 << (2 * (x negated) + (y negated))``"""
+    a, b = distinct
+    if abs(a) == abs(b):
+        return
+    ref = abs(a) * (state.nbvars + 1) + abs(b)
+    state.xor2_detect[ref] |= 1 << (2 * (a < 0) + (b < 0))
+
+
 def expensive_clause_features(state, clause):
-    """Computationally expensive clause features"""
-    state.clause_lengths.append(len(clause))
-    pos = len(list(filter(lambda v: v > 0, clause)))
-    state.positive_literals_in_clause.append(pos)
-    state.negative_literals_in_clause.append(len(clause) - pos)
+    """Computationally expensive clause features of a :class:`NormalizedClause`"""
+    state.clause_polarities[clause.positives, clause.negatives] += 1
 
-    sd = statistics.pstdev(map(abs, clause))
-    state.clause_variables_sd.append(sd)
+    literals = clause.literals
+    sd = _pstdev(len(literals), sum(map(abs, literals)), sum(map(operator.mul, literals, literals)))
+    state.clause_variables_sd.add(sd)
 
-    if len(clause) == 2:
-        s = sorted(clause)
-        ref = (abs(s[0]), abs(s[1]))
-        id = {True: 8, False: 4}[s[0] > 0] + {True: 2, False: 1}[s[1] > 0]
-        state.xor2_detect[ref] |= id
+    if state.retain_clauses:
+        state.clause_fingerprints.add(
+            fingerprints.canonical_fingerprint(clause.distinct, state.nbvars))
+        if len(literals) == 2 and len(clause.distinct) == 2:
+            _xor2_update(state, clause.distinct)
 
 
 def expensive_literal_features(state, literal):
-    """Computationally expensive literal features"""
-    state.literals.add(literal)
-    state.literals_occurences[literal] += 1
+    """Computationally expensive literal features.
+    `literal` must be within nbvars, which is checked by
+    :func:`linear_literal_features` or the DIMACS reader.
+    """
+    state.literals_occurences[literal + state.nbvars] += 1
+
+
+COLLECTORS = {
+    'linear': ([], [linear_clause_features], [linear_literal_features]),
+    'components': ([component_header_features], [component_clause_features], []),
+    'expensive': ([], [expensive_clause_features], []),
+    'frequency': ([frequency_header_features], [], [expensive_literal_features])
+}
 
 
 def dispatch(reader, state, header_update_fns, clause_update_fns, lit_update_fns):
     """Read literals from `reader` and dispatch to call corresponding functions.
     All `header_update_fns` will be called with `state` and the first two values of `reader`.
-    If a clause was terminated, call all `clause_update_fns` with ``(state, clause)``.
+    If a clause was terminated, call all `clause_update_fns` with ``(state, clause)``
+    where `clause` is the :class:`NormalizedClause` of the clause.
     If a literal was read, call all `lit_update_fns` with ``(state, lit)``.
 
     :param reader:              An iterable for literals
@@ -290,10 +752,74 @@ def dispatch(reader, state, header_update_fns, clause_update_fns, lit_update_fns
     clause = []
     for lit in reader:
         if lit == 0:
-            for fn in clause_update_fns:
-                fn(state, tuple(clause))
+            if clause_update_fns:
+                normalized = NormalizedClause(tuple(clause))
+                for fn in clause_update_fns:
+                    fn(state, normalized)
             clause = []
         else:
             for fn in lit_update_fns:
                 fn(state, lit)
             clause.append(lit)
+
+
+def _dispatch_clauses(literals, offsets, state, clause_update_fns, lit_update_fns):
+    """Dispatch clauses given as `literals` buffer delimited by `offsets`"""
+    view = memoryview(literals)
+    begin = offsets[0]
+    for end in offsets[1:]:
+        clause = view[begin:end]
+        for lit in clause:
+            for fn in lit_update_fns:
+                fn(state, lit)
+        if clause_update_fns:
+            normalized = NormalizedClause(clause)
+            for fn in clause_update_fns:
+                fn(state, normalized)
+        begin = end
+
+
+def dispatch_bulk(reader, state, header_update_fns, clause_update_fns, lit_update_fns):
+    """Like :func:`dispatch`, but `reader` is a generator
+    as returned by :func:`cnfanalysis.dimacs.read_bulk`.
+    Clauses are normalized memoryview slices of the block read.
+
+    :param reader:              An iterable for header values and clause blocks
+    :type reader:               iter
+    :param state:               any object to hold intermediate feature values
+    :type state:                object
+    :param header_update_fns:   Callables updating feature values for header values
+    :type header_update_fns:    Callable
+    :param clause_update_fns:   Callables updating feature values for a given clause
+    :type clause_update_fns:    Callable
+    :param lit_update_fns:      Callables updating feature values for a given literal
+    :type lit_update_fns:       Callable
+    """
+    nbvars = next(reader)
+    nbclauses = next(reader)
+    for fn in header_update_fns:
+        fn(state, nbvars, nbclauses)
+
+    for literals, offsets in reader:
+        _dispatch_clauses(literals, offsets, state, clause_update_fns, lit_update_fns)
+
+
+def dispatch_cnf(cnf, state, header_update_fns, clause_update_fns, lit_update_fns):
+    """Like :func:`dispatch`, but dispatch the header values and clauses
+    of a :class:`cnfanalysis.dimacs.CNF` object. Clauses are normalized
+    memoryview slices of its literal buffer.
+
+    :param cnf:                 CNF in compressed sparse row layout
+    :type cnf:                  cnfanalysis.dimacs.CNF
+    :param state:               any object to hold intermediate feature values
+    :type state:                object
+    :param header_update_fns:   Callables updating feature values for header values
+    :type header_update_fns:    Callable
+    :param clause_update_fns:   Callables updating feature values for a given clause
+    :type clause_update_fns:    Callable
+    :param lit_update_fns:      Callables updating feature values for a given literal
+    :type lit_update_fns:       Callable
+    """
+    for fn in header_update_fns:
+        fn(state, cnf.nbvars, cnf.nbclauses)
+    _dispatch_clauses(cnf.literals, cnf.offsets, state, clause_update_fns, lit_update_fns)
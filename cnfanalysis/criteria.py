@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+"""
+    cnfanalysis.criteria
+    --------------------
+
+    Criteria on features like "clauses_count>1000" to select
+    CNF files from featuresfiles and corpus tables.
+
+    (C) 2015-2016, CC-0, Lukas Prokop
+"""
+
+import re
+import operator
+
+
+OPERATORS = {'==': operator.eq, '!=': operator.ne, '>': operator.gt, '<': operator.lt}
+
+
+def parse_value(val):
+    """Convert the value of a criterion to bool, int, float or str"""
+    if val.lower() in {'true', 'false'}:
+        return val.lower() == 'true'
+    try:
+        return int(val)
+    except ValueError:
+        pass
+    try:
+        return float(val)
+    except ValueError:
+        return val
+
+
+def parse(crit):
+    """Parse a criterion of syntax ``<feature>{==,!=,>,<}<value>``.
+    Metadata attributes are referred to with a leading '@'.
+
+    :param crit:        criterion like 'clauses_count>1e6'
+    :type crit:         str
+    :return:            feature name, operator and value
+    :rtype:             (str, str, bool | int | float | str)
+    """
+    match = re.match(r'\s*([^=!<>]+?)\s*(==|!=|>|<)\s*(.*?)\s*$', crit)
+    if not match:
+        raise ValueError('No operator like {==,!=,>,<} found in criterion')
+    feature, op, val = match.groups()
+    return feature, op, parse_value(val)
+
+
+def _test(op, value):
+    """Return a function testing a single value, missing values never match"""
+    op = OPERATORS[op]
+    return lambda v: v is not None and op(v, value)
+
+
+def compile(criteria):
+    """Compile parsed `criteria` into a predicate on records as returned
+    by :func:`cnfanalysis.stats.read`. A record matches if it meets all
+    criteria. Missing features do not meet any criterion.
+
+    :param criteria:    criteria as returned by :func:`parse`
+    :type criteria:     [(str, str, object)]
+    :return:            predicate on records
+    :rtype:             Callable
+    """
+    tests = [(feature.startswith('@'), feature, _test(op, value))
+             for feature, op, value in criteria]
+
+    def predicate(record):
+        featuring = record.get('featuring', {})
+        for meta, feature, test in tests:
+            if not test(record.get(feature) if meta else featuring.get(feature)):
+                return False
+        return True
+
+    return predicate
+
+
+def mask(criteria, table):
+    """Evaluate parsed `criteria` on all rows of a corpus table at once.
+
+    :param criteria:    criteria as returned by :func:`parse`
+    :type criteria:     [(str, str, object)]
+    :param table:       column names associated with lists of values
+                        as returned by :func:`cnfanalysis.stats.read_corpus`
+    :type table:        {str: list}
+    :return:            for every row, does it meet all criteria?
+    :rtype:             [bool]
+    """
+    rows = len(next(iter(table.values()), []))
+    result = [True] * rows
+    for feature, op, value in criteria:
+        column = table.get(feature, [None] * rows)
+        result = list(map(operator.and_, result, map(_test(op, value), column)))
+    return result
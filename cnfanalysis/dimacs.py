@@ -10,6 +10,11 @@
 """
 
 import re
+import bz2
+import gzip
+import lzma
+import mmap
+import array
 
 
 class NbVarsError(ValueError):
@@ -20,6 +25,58 @@ class NbClausesError(ValueError):
     pass
 
 
+COMPRESSION_MAGIC = [
+    (b'\x1f\x8b', 'gzip'),
+    (b'BZh', 'bz2'),
+    (b'\xfd7zXZ\x00', 'xz'),
+    (b'\x28\xb5\x2f\xfd', 'zstd')
+]
+COMPRESSION_EXTENSIONS = {'gz', 'bz2', 'xz', 'zst'}
+
+
+def detect_compression(filepath):
+    """Detect the compression format of a file by its magic bytes.
+
+    :param filepath:    filepath to read the first bytes from
+    :type filepath:     str
+    :return:            'gzip', 'bz2', 'xz', 'zstd' or None (uncompressed)
+    :rtype:             str | None
+    """
+    with open(filepath, 'rb') as fd:
+        magic = fd.read(6)
+    for prefix, compression in COMPRESSION_MAGIC:
+        if magic.startswith(prefix):
+            return compression
+    return None
+
+
+def open_cnf(filepath, fileobj=None):
+    """Open a DIMACS CNF file for reading bytes.
+    gzip, bzip2, xz and zstd compressed files are decompressed
+    transparently while reading. zstd requires the `zstandard` package.
+
+    :param filepath:    filepath of (compressed) DIMACS CNF file
+    :type filepath:     str
+    :param fileobj:     binary file object of `filepath` to read the (compressed)
+                        content from instead of opening `filepath` again
+    :return:            binary file object
+    """
+    compression = detect_compression(filepath)
+    source = filepath if fileobj is None else fileobj
+    if compression == 'gzip':
+        return gzip.open(source, 'rb')
+    elif compression == 'bz2':
+        return bz2.open(source, 'rb')
+    elif compression == 'xz':
+        return lzma.open(source, 'rb')
+    elif compression == 'zstd':
+        import zstandard
+        if fileobj is None:
+            fileobj = open(filepath, 'rb')
+        return zstandard.ZstdDecompressor().stream_reader(fileobj, closefd=True)
+    return open(filepath, 'rb') if fileobj is None else fileobj
+
+
 def read(filedescriptor, ignore_lines='c%',
          check_nbvars=False, check_nbclauses=False):
     """Read nbvars, nbclauses and literals of a DIMACS CNF file.
@@ -83,9 +140,9 @@ def read(filedescriptor, ignore_lines='c%',
                 was_zero = (lit == 0)
                 if was_zero:
                     clauses += 1
-                if check_nbvars and (-nbvars <= lit <= nbvars):
+                if check_nbvars and not (-nbvars <= lit <= nbvars):
                     errmsg = 'Literal {} exceeds nbvars [-{}, {}]'
-                    raise NbVarsError(errmsg.format(lit, -nbvars, nbvars))
+                    raise NbVarsError(errmsg.format(lit, nbvars, nbvars))
                 yield lit
 
     if mode == 0:
@@ -95,3 +152,334 @@ def read(filedescriptor, ignore_lines='c%',
     if check_nbclauses and clauses != nbclauses:
         errmsg = 'Expected {} clauses, got {} clauses'
         raise NbClausesError(errmsg.format(nbclauses, clauses))
+
+
+def _line_prefixes(ignore_lines):
+    """Encode the line prefixes to ignore as a tuple of bytes objects"""
+    if isinstance(ignore_lines, (bytes, bytearray)):
+        return tuple(bytes([b]) for b in ignore_lines)
+    return tuple(p.encode('utf-8') for p in ignore_lines)
+
+
+def _startline(data, prefix):
+    """Does any line in `data` start with bytes `prefix`?"""
+    return data.startswith(prefix) or (b'\n' + prefix) in data
+
+
+def _lineno(data, prefix):
+    """Return the 1-based line number of the first line
+    in `data` starting with `prefix`"""
+    if data.startswith(prefix):
+        return 1
+    return data[:data.find(b'\n' + prefix) + 1].count(b'\n') + 1
+
+
+def read_bulk(filedescriptor, ignore_lines='c%', check_nbvars=False,
+              check_nbclauses=False, chunk_size=1 << 20, header=None):
+    """Read nbvars, nbclauses and clauses of a DIMACS CNF file blockwise.
+    The file descriptor provided must return bytes objects.
+    Semantics are the same as for :func:`read`, but whole blocks of
+    `chunk_size` bytes are tokenized at once.
+
+    Given the CNF file of :func:`read`, return a generator yielding
+    nbvars, nbclauses and then ``(literals, offsets)`` tuples::
+
+        4
+        3
+        (array('i', [1, -2, 3, -4, -2, 1, -4]), array('q', [0, 2, 5, 7]))
+
+    `literals` contains the literals of all clauses of this block without
+    terminating zeros. Clause ``i`` of this block is given by
+    ``literals[offsets[i]:offsets[i + 1]]``. Clauses never span blocks.
+
+    If `header` is given, `filedescriptor` returns a fragment of clause
+    lines after the header line (see :func:`split_ranges`). The header
+    values are not parsed, but taken from `header`. Line numbers in
+    error messages are relative to the fragment.
+
+    :param filedescriptor:  file descriptor returning DIMACS CNF bytes
+    :param ignore_lines:    prefixes of lines to ignore
+                            (like 'c' for comment lines)
+    :type ignore_lines:     [str]
+    :param check_nbvars:    raise NbVarsError if a literal exceeds nbvars
+    :type check_nbvars:     bool
+    :param check_nbclauses: raise NbClausesError if the number of clauses
+                            does not match nbclauses
+    :type check_nbclauses:  bool
+    :param chunk_size:      number of bytes to read at once
+    :type chunk_size:       int
+    :param header:          nbvars and nbclauses of a fragment or None
+    :type header:           (int, int)
+    :return:                generator for header values and clause blocks
+    """
+    skip = _line_prefixes(ignore_lines)
+    nbvars = None
+    if header is not None:
+        nbvars, nbclauses = header
+        yield nbvars
+        yield nbclauses
+    clauses = 0
+    lineno = 0
+    last = None
+    tail = []
+    rest = b''
+
+    while True:
+        block = filedescriptor.read(chunk_size)
+        if block:
+            data = rest + block
+            cut = data.rfind(b'\n') + 1
+            if cut == 0:
+                rest = data
+                continue
+            data, rest = data[:cut], data[cut:]
+        elif rest:
+            data, rest = rest, b''
+        else:
+            break
+
+        if nbvars is None:
+            lines = data.split(b'\n')
+            for i, line in enumerate(lines):
+                errsuf = " at line {}".format(lineno + i + 1)
+                if line.startswith(b'p'):
+                    match = re.match(br'p cnf\s+(\d+)\s+(\d+)\s*$', line, re.I)
+                    if not match:
+                        raise ValueError('Invalid header line' + errsuf)
+                    nbvars = int(match.group(1))
+                    yield nbvars
+                    nbclauses = int(match.group(2))
+                    yield nbclauses
+                    break
+                elif line.strip() == b'' or line.startswith(skip):
+                    pass
+                else:
+                    raise ValueError('Expected CNF header, got clause line' + errsuf)
+            if nbvars is None:
+                lineno += data.count(b'\n')
+                continue
+            lineno += i + 1
+            data = b'\n'.join(lines[i + 1:])
+
+        if _startline(data, b'p'):
+            errsuf = " at line {}".format(lineno + _lineno(data, b'p'))
+            raise ValueError('Unexpected DIMACS header' + errsuf)
+        # count lines before ignored lines are removed
+        lineno += data.count(b'\n')
+        if any(_startline(data, p) for p in skip):
+            data = b'\n'.join(l for l in data.split(b'\n') if not l.startswith(skip))
+
+        lits = list(map(int, data.split()))
+        if not lits:
+            continue
+        last = lits[-1]
+        if check_nbvars and not (-nbvars <= min(lits) and max(lits) <= nbvars):
+            lit = next(l for l in lits if not (-nbvars <= l <= nbvars))
+            errmsg = 'Literal {} exceeds nbvars [-{}, {}]'
+            raise NbVarsError(errmsg.format(lit, nbvars, nbvars))
+
+        if tail:
+            lits = tail + lits
+        ends = []
+        pos = -1
+        try:
+            while True:
+                pos = lits.index(0, pos + 1)
+                ends.append(pos - len(ends))
+        except ValueError:
+            pass
+        if not ends:
+            tail = lits
+            continue
+
+        zero = ends[-1] + len(ends) - 1
+        tail = lits[zero + 1:]
+        del lits[zero + 1:]
+        clauses += len(ends)
+
+        offsets = array.array('q', [0])
+        offsets.extend(ends)
+        yield array.array('i', filter(None, lits)), offsets
+
+    if nbvars is None:
+        raise ValueError('Empty DIMACS CNF file. Expected at least a header')
+    if header is not None:
+        # a fragment without clauses contributes no clause
+        if tail:
+            yield array.array('i', tail), array.array('q', [0, len(tail)])
+        return
+    if last != 0:
+        yield array.array('i', tail), array.array('q', [0, len(tail)])
+    if check_nbclauses and clauses != nbclauses:
+        errmsg = 'Expected {} clauses, got {} clauses'
+        raise NbClausesError(errmsg.format(nbclauses, clauses))
+
+
+def split_ranges(filepath, n, ignore_lines='c%'):
+    """Split the clause lines of an uncompressed DIMACS CNF file into
+    at most `n` byte ranges of about equal size. Every range ends after
+    a line terminating a clause, hence no clause spans two ranges.
+    Every range can be read with :class:`RangeReader` and
+    :func:`read_bulk` given the header values returned.
+
+    :param filepath:        filepath of uncompressed DIMACS CNF file
+    :type filepath:         str
+    :param n:               desired number of ranges
+    :type n:                int
+    :param ignore_lines:    prefixes of lines to ignore
+                            (like 'c' for comment lines)
+    :type ignore_lines:     [str]
+    :return:                nbvars and nbclauses, list of (start, end) offsets
+    :rtype:                 ((int, int), [(int, int)])
+    """
+    skip = _line_prefixes(ignore_lines)
+    with open(filepath, 'rb') as fd:
+        try:
+            mm = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise ValueError('Empty DIMACS CNF file. Expected at least a header')
+        with mm:
+            size = len(mm)
+            pos, lineno = 0, 0
+            header = None
+            while header is None:
+                if pos >= size:
+                    raise ValueError('Empty DIMACS CNF file. Expected at least a header')
+                end = mm.find(b'\n', pos)
+                end = size if end < 0 else end
+                line = mm[pos:end]
+                lineno += 1
+                errsuf = " at line {}".format(lineno)
+                if line.startswith(b'p'):
+                    header = re.match(br'p cnf\s+(\d+)\s+(\d+)\s*$', line, re.I)
+                    if not header:
+                        raise ValueError('Invalid header line' + errsuf)
+                elif not (line.strip() == b'' or line.startswith(skip)):
+                    raise ValueError('Expected CNF header, got clause line' + errsuf)
+                pos = end + 1
+
+            bounds = [min(pos, size)]
+            for i in range(1, n):
+                cut = max(bounds[-1], bounds[0] + i * (size - bounds[0]) // n)
+                # advance to the end of the next line terminating a clause
+                cut = mm.rfind(b'\n', 0, cut) + 1
+                while cut < size:
+                    end = mm.find(b'\n', cut)
+                    end = size if end < 0 else end
+                    line = mm[cut:end]
+                    cut = end + 1
+                    if line.startswith(skip) or line.startswith(b'p'):
+                        continue
+                    tokens = line.rsplit(None, 1)
+                    if tokens and tokens[-1] == b'0':
+                        break
+                bounds.append(min(cut, size))
+            bounds.append(size)
+
+    nbvars, nbclauses = int(header.group(1)), int(header.group(2))
+    ranges = [(a, b) for a, b in zip(bounds, bounds[1:]) if a < b]
+    return (nbvars, nbclauses), ranges
+
+
+class RangeReader:
+    """File object reading bytes from `start` to `end` of filepath"""
+
+    def __init__(self, filepath, start, end):
+        self.fd = open(filepath, 'rb')
+        self.fd.seek(start)
+        self.remaining = end - start
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        buf = self.fd.read(size)
+        self.remaining -= len(buf)
+        return buf
+
+    def close(self):
+        self.fd.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CNF:
+    """A CNF held in memory in compressed sparse row layout.
+    All literals are stored in one flat buffer without terminating zeros.
+    Clause ``i`` is ``literals[offsets[i]:offsets[i + 1]]``.
+    """
+
+    def __init__(self, nbvars, nbclauses, literals=None, offsets=None):
+        self.nbvars = nbvars
+        self.nbclauses = nbclauses
+        self.literals = array.array('i') if literals is None else literals
+        self.offsets = array.array('q', [0]) if offsets is None else offsets
+
+    @classmethod
+    def from_reader(cls, reader):
+        """Create a CNF from a generator as returned by :func:`read_bulk`"""
+        cnf = cls(next(reader), next(reader))
+        for literals, offsets in reader:
+            cnf.extend(literals, offsets)
+        return cnf
+
+    def extend(self, literals, offsets):
+        """Append a block of clauses as yielded by :func:`read_bulk`"""
+        base = len(self.literals) - offsets[0]
+        self.literals.extend(literals)
+        self.offsets.extend(map(base.__add__, offsets[1:]))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return memoryview(self.literals)[self.offsets[index]:self.offsets[index + 1]]
+
+    def __iter__(self):
+        view = memoryview(self.literals)
+        begin = self.offsets[0]
+        for end in self.offsets[1:]:
+            yield view[begin:end]
+            begin = end
+
+
+def load(filepath, ignore_lines='c%', check_nbvars=False,
+         check_nbclauses=False, chunk_size=1 << 20):
+    """Load a DIMACS CNF file into a :class:`CNF` object.
+    The file is memory-mapped and parsed once with :func:`read_bulk`.
+    Compressed files are decompressed while parsing instead.
+    Memory usage is 4 bytes per literal plus 8 bytes per clause.
+
+    :param filepath:        filepath of DIMACS CNF file
+    :type filepath:         str
+    :param ignore_lines:    prefixes of lines to ignore
+                            (like 'c' for comment lines)
+    :type ignore_lines:     [str]
+    :param check_nbvars:    raise NbVarsError if a literal exceeds nbvars
+    :type check_nbvars:     bool
+    :param check_nbclauses: raise NbClausesError if the number of clauses
+                            does not match nbclauses
+    :type check_nbclauses:  bool
+    :param chunk_size:      number of bytes to tokenize at once
+    :type chunk_size:       int
+    :return:                the CNF in compressed sparse row layout
+    :rtype:                 CNF
+    """
+    if detect_compression(filepath):
+        with open_cnf(filepath) as fd:
+            reader = read_bulk(fd, ignore_lines, check_nbvars=check_nbvars,
+                               check_nbclauses=check_nbclauses, chunk_size=chunk_size)
+            return CNF.from_reader(reader)
+
+    with open(filepath, 'rb') as fd:
+        try:
+            mm = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise ValueError('Empty DIMACS CNF file. Expected at least a header')
+        with mm:
+            reader = read_bulk(mm, ignore_lines, check_nbvars=check_nbvars,
+                               check_nbclauses=check_nbclauses, chunk_size=chunk_size)
+            return CNF.from_reader(reader)
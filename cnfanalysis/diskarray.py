@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+
+"""
+    cnfanalysis.diskarray
+    ---------------------
+
+    Arrays of numbers stored in temporary files mapped into memory.
+    Pages are written back to the file instead of occupying memory,
+    hence arrays larger than the memory available can be updated.
+
+    (C) 2015-2016, CC-0, Lukas Prokop
+"""
+
+import mmap
+import array
+import tempfile
+
+
+def zeros(typecode, n, directory=None):
+    """Return an array of `n` zeros of type `typecode` (like 'i' or 'Q').
+    It is a memoryview supporting indexing, slicing and iteration
+    like `array.array`, but it cannot be resized or pickled.
+
+    :param typecode:    typecode of `array.array`
+    :type typecode:     str
+    :param n:           number of items
+    :type n:            int
+    :param directory:   directory of the temporary file, None for the default
+    :type directory:    str
+    :return:            array of `n` zeros
+    :rtype:             memoryview
+    """
+    size = array.array(typecode).itemsize * max(n, 1)
+    with tempfile.TemporaryFile(dir=directory) as fd:
+        # the file is sparse, zeros are not written
+        fd.truncate(size)
+        # the mapping keeps its own reference to the file after closing `fd`
+        data = mmap.mmap(fd.fileno(), size)
+    view = memoryview(data).cast(typecode)
+    return view[:n]
+
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+"""
+    cnfanalysis.fingerprints
+    ------------------------
+
+    Compact set of 64-bit fingerprints of clauses to count
+    distinct clauses without keeping the clauses in memory.
+
+    (C) 2015-2016, CC-0, Lukas Prokop
+"""
+
+import array
+
+
+def fingerprint(clause, nbvars):
+    """Return the 64-bit fingerprint of a clause. Clauses with the same
+    set of literals (in any order, with repeated literals) share
+    a fingerprint. It is never zero and does not depend on the process,
+    hence fingerprints of different processes can be merged.
+
+    :param clause:      literals of the clause
+    :type clause:       iterable of int
+    :param nbvars:      number of variables of the CNF
+    :type nbvars:       int
+    :return:            non-zero signed 64-bit integer
+    :rtype:             int
+    """
+    return canonical_fingerprint(canonical(clause), nbvars)
+
+
+def canonical(clause):
+    """Return the distinct literals of a clause sorted by variable,
+    a negative literal preceding the positive literal of its variable.
+
+    :param clause:      literals of the clause
+    :type clause:       iterable of int
+    :rtype:             list of int
+    """
+    # sort is stable, hence -v remains in front of v
+    return sorted(sorted(set(clause)), key=abs)
+
+
+def canonical_fingerprint(literals, nbvars):
+    """Like :func:`fingerprint`, but `literals` must be
+    canonical already as returned by :func:`canonical`"""
+    # hashes of tuples of integers are not randomized per process, literals
+    # are shifted to non-negative integers because hash(-1) == hash(-2)
+    return hash(tuple(map(nbvars.__add__, literals))) or 1
+
+
+class FingerprintSet:
+    """Set of non-zero 64-bit integers in one `array.array` using open
+    addressing with linear probing. It takes 8 bytes per slot and
+    between 10.7 and 21.3 bytes per element for the load factors of 3/8
+    to 3/4 kept, instead of the ~100 bytes a Python set of clause tuples
+    takes. Distinct clauses are counted correctly unless two of them
+    share a fingerprint, which is unlikely for less than 10^9 clauses.
+
+    :param capacity:    initial number of slots, a power of two
+    :type capacity:     int
+    """
+
+    def __init__(self, capacity=1 << 10):
+        self.slots = array.array('q', [0]) * capacity
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return filter(None, self.slots)
+
+    def add(self, fp):
+        """Add fingerprint `fp`
+
+        :return:    False if `fp` was already in the set
+        :rtype:     bool
+        """
+        slots = self.slots
+        mask = len(slots) - 1
+        i = fp & mask
+        current = slots[i]
+        while current:
+            if current == fp:
+                return False
+            i = (i + 1) & mask
+            current = slots[i]
+        slots[i] = fp
+        self.count += 1
+        if 4 * self.count > 3 * len(slots):
+            self._resize(2 * len(slots))
+        return True
+
+    def update(self, fps):
+        """Add all fingerprints of iterable `fps`"""
+        for fp in fps:
+            self.add(fp)
+
+    def _resize(self, capacity):
+        old = self.slots
+        slots = self.slots = array.array('q', [0]) * capacity
+        mask = capacity - 1
+        # fingerprints of `old` are distinct, only free slots are searched
+        for fp in filter(None, old):
+            i = fp & mask
+            while slots[i]:
+                i = (i + 1) & mask
+            slots[i] = fp
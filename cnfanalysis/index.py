@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+"""
+    cnfanalysis.index
+    -----------------
+
+    Persistent SQLite index of featuresfiles to
+    select CNF files by criteria on their features.
+
+    (C) 2015-2016, CC-0, Lukas Prokop
+"""
+
+import os
+import sqlite3
+
+from . import stats
+from . import cache
+
+
+SQL_TYPES = {str: 'TEXT', bool: 'INTEGER', int: 'INTEGER', float: 'REAL'}
+SQL_OPERATORS = {'==': '=', '!=': '!=', '>': '>', '<': '<'}
+
+
+def default_path():
+    """Filepath of the index database in the user's cache directory"""
+    return os.path.join(cache.cache_dir(), 'index.sqlite')
+
+
+def _quote(name):
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+class FeatureIndex:
+    """Index of all records of featuresfiles in an SQLite database at
+    `path`. Every record is a row with one column per metadata attribute
+    and feature of :func:`cnfanalysis.stats.corpus_columns`. A featuresfile
+    is only read again if its modification time or size changed.
+
+    :param path:        filepath of the database, None for :func:`default_path`
+    :type path:         str
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_path()
+        dirname = os.path.dirname(self.path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        self.columns = stats.corpus_columns()
+        self.db = sqlite3.connect(self.path, timeout=60)
+        self._setup()
+
+    def _setup(self):
+        """Create tables, recreate them if the set of features changed"""
+        existing = [row[1] for row in self.db.execute('PRAGMA table_info(records)')]
+        expected = ['source', 'position'] + [name for name, typ in self.columns]
+        if existing == expected:
+            return
+        columns = ', '.join('{} {}'.format(_quote(name), SQL_TYPES[typ])
+                            for name, typ in self.columns)
+        with self.db:
+            self.db.executescript('''
+                DROP TABLE IF EXISTS records;
+                DROP TABLE IF EXISTS sources;
+                CREATE TABLE sources (path TEXT PRIMARY KEY, mtime REAL, size INTEGER);
+                CREATE TABLE records (source TEXT NOT NULL, position INTEGER NOT NULL, {});
+                CREATE INDEX records_source ON records (source);
+            '''.format(columns))
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _row(self, source, position, record):
+        featuring = record.get('featuring', {})
+        row = [source, position]
+        for name, typ in self.columns:
+            value = record.get(name) if name.startswith('@') else featuring.get(name)
+            row.append(value)
+        return row
+
+    def prune(self):
+        """Remove featuresfiles from the index which do not exist anymore
+
+        :return:            number of featuresfiles removed
+        :rtype:             int
+        """
+        missing = [(path,) for path, in self.db.execute('SELECT path FROM sources')
+                   if not os.path.exists(path)]
+        with self.db:
+            self.db.executemany('DELETE FROM records WHERE source = ?', missing)
+            self.db.executemany('DELETE FROM sources WHERE path = ?', missing)
+        return len(missing)
+
+    def update(self, statsfiles):
+        """Index all featuresfiles in `statsfiles` which are new or
+        were modified since they were indexed.
+
+        :param statsfiles:  filepaths of featuresfiles
+        :type statsfiles:   [str]
+        :return:            number of featuresfiles (re-)indexed
+        :rtype:             int
+        """
+        indexed = dict((path, (mtime, size)) for path, mtime, size
+                       in self.db.execute('SELECT path, mtime, size FROM sources'))
+        placeholders = ', '.join('?' * (len(self.columns) + 2))
+        insert = 'INSERT INTO records VALUES ({})'.format(placeholders)
+        updated = 0
+        with self.db:
+            for statsfile in statsfiles:
+                path = os.path.abspath(statsfile)
+                st = os.stat(path)
+                if indexed.get(path) == (st.st_mtime, st.st_size):
+                    continue
+                self.db.execute('DELETE FROM records WHERE source = ?', (path,))
+                self.db.executemany(insert, (self._row(path, i, record) for i, record
+                                             in enumerate(stats.read(path))))
+                self.db.execute('INSERT OR REPLACE INTO sources VALUES (?, ?, ?)',
+                                (path, st.st_mtime, st.st_size))
+                updated += 1
+        return updated
+
+    def query(self, crits, statsfiles=None):
+        """Select records meeting all criteria `crits`.
+
+        :param crits:       criteria as returned by :func:`cnfanalysis.criteria.parse`
+        :type crits:        [(str, str, object)]
+        :param statsfiles:  restrict to records of these featuresfiles,
+                            None considers all featuresfiles in the index
+        :type statsfiles:   [str]
+        :return:            pairs of featuresfile and @filename of the record
+        :rtype:             [(str, str)]
+        """
+        names = set(name for name, typ in self.columns)
+        conditions, params = [], []
+        for feature, op, value in crits:
+            if feature not in names:
+                raise ValueError('Unknown feature "{}"'.format(feature))
+            conditions.append('{} {} ?'.format(_quote(feature), SQL_OPERATORS[op]))
+            params.append(value)
+
+        sql = 'SELECT source, "@filename" FROM records'
+        if statsfiles is not None:
+            self.db.execute('CREATE TEMP TABLE IF NOT EXISTS selected (path TEXT PRIMARY KEY)')
+            self.db.execute('DELETE FROM selected')
+            self.db.executemany('INSERT OR IGNORE INTO selected VALUES (?)',
+                                ((os.path.abspath(f),) for f in statsfiles))
+            conditions.append('source IN (SELECT path FROM selected)')
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        return self.db.execute(sql + ' ORDER BY source, position', params).fetchall()
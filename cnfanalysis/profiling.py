@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+"""
+    cnfanalysis.profiling
+    ---------------------
+
+    Opt-in instrumentation of feature evaluation: time and calls
+    of every collector function, progress of reading a CNF file
+    and peak memory.
+
+    (C) 2015-2016, CC-0, Lukas Prokop
+"""
+
+import sys
+import time
+import datetime
+import contextlib
+import collections
+
+
+def peak_memory():
+    """Peak resident memory of this process or its largest terminated
+    child process (like processes of split files) in bytes or None if unknown"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _megabytes(size):
+    return '{:.1f} MB'.format(size / 1e6) if size is not None else 'unknown'
+
+
+class CountingReader:
+    """Wraps a binary file object and counts the bytes read from it.
+    Progress is reported to `profile` after every read.
+    """
+
+    def __init__(self, fd, profile):
+        self.fd = fd
+        self.profile = profile
+
+    def read(self, size=-1):
+        buf = self.fd.read(size)
+        self.profile.bytes += len(buf)
+        self.profile.report()
+        return buf
+
+    def close(self):
+        self.fd.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Profile:
+    """Records cumulative time and number of calls of functions
+    wrapped with :meth:`wrap` and sections timed with :meth:`section`.
+    Every `interval` seconds progress is printed to `stream`.
+
+    Timing every call to a literal function slows down evaluation,
+    hence profiling has to be enabled explicitly.
+
+    :param name:        name of the CNF file in progress reports
+    :type name:         str
+    :param total:       size of the CNF file in bytes or None
+    :type total:        int
+    :param interval:    seconds between progress reports, None for no reports
+    :type interval:     float
+    :param stream:      text stream to print progress reports to, default stderr
+    """
+
+    def __init__(self, name='', total=None, interval=10.0, stream=None):
+        self.name = name
+        self.total = total
+        self.interval = interval
+        self.stream = stream or sys.stderr
+        self.bytes = 0
+        # function name -> [calls, seconds]
+        self.functions = collections.OrderedDict()
+        self.start = time.perf_counter()
+        self.last_report = self.start
+
+    def _counter(self, name):
+        return self.functions.setdefault(name, [0, 0.0])
+
+    def wrap(self, fn, name=None):
+        """Return a function calling `fn` and recording its time and calls"""
+        counter = self._counter(name or fn.__name__)
+        clock = time.perf_counter
+
+        def wrapper(*args):
+            start = clock()
+            try:
+                return fn(*args)
+            finally:
+                counter[0] += 1
+                counter[1] += clock() - start
+
+        return wrapper
+
+    def collectors(self, header_fns, clause_fns, literal_fns):
+        """Wrap header, clause and literal update functions
+        as returned by :func:`cnfanalysis.collect.collectors`"""
+        return ([self.wrap(fn) for fn in header_fns],
+                [self.wrap(fn) for fn in clause_fns],
+                [self.wrap(fn) for fn in literal_fns])
+
+    def iterate(self, reader, name='read'):
+        """Yield the values of `reader` and record the time
+        spent for every value as function `name`"""
+        counter = self._counter(name)
+        clock = time.perf_counter
+        iterator = iter(reader)
+        while True:
+            start = clock()
+            try:
+                value = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                counter[0] += 1
+                counter[1] += clock() - start
+            yield value
+
+    @contextlib.contextmanager
+    def section(self, name):
+        """Record the time of a `with` block as one call of function `name`"""
+        counter = self._counter(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            counter[0] += 1
+            counter[1] += time.perf_counter() - start
+
+    def counting(self, fd):
+        """Wrap binary file object `fd` to count the bytes read for progress"""
+        return CountingReader(fd, self)
+
+    def report(self, force=False):
+        """Print progress if `interval` seconds passed since the last report"""
+        now = time.perf_counter()
+        if self.interval is None or (not force and now - self.last_report < self.interval):
+            return
+        self.last_report = now
+        elapsed = now - self.start
+        progress = _megabytes(self.bytes)
+        if self.total:
+            progress += ' of {} ({:.1%})'.format(_megabytes(self.total), self.bytes / self.total)
+            if 0 < self.bytes < self.total:
+                remaining = elapsed * (self.total - self.bytes) / self.bytes
+                progress += ', ETA {}'.format(datetime.timedelta(seconds=round(remaining)))
+        slowest = sorted(self.functions.items(), key=lambda item: -item[1][1])[:3]
+        functions = ', '.join('{} {:.1f} s'.format(name, seconds)
+                              for name, (calls, seconds) in slowest)
+        print('{} - {} read {}, peak memory {}, {}'.format(
+              datetime.datetime.now().isoformat(), self.name, progress,
+              _megabytes(peak_memory()), functions), file=self.stream)
+
+    def metadata(self):
+        """Return the measurements as '@timing' metadata entry of a featuresfile"""
+        return {"@timing": {
+            "seconds": time.perf_counter() - self.start,
+            "bytes": self.bytes,
+            "size": self.total,
+            "peak_memory": peak_memory(),
+            "functions": dict((name, {"calls": calls, "seconds": seconds})
+                              for name, (calls, seconds) in self.functions.items())
+        }}
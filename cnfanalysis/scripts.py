@@ -11,24 +11,180 @@
 
 import re
 import sys
-import json
+import queue
 import os.path
 import argparse
 import operator
 import datetime
+import functools
+import contextlib
 import multiprocessing
 
 from . import dimacs
 from . import collect
 from . import stats
+from . import cache
+from . import criteria
+from . import index
+from . import profiling
+from . import binary
+from . import checkpoint as checkpoints
+
+
+# evaluation takes about 10 times the file size in memory (SAT competition 2016)
+MEMORY_FACTOR = 10
+# assumed ratio of uncompressed to compressed file size
+COMPRESSION_RATIO = 5
+
+
+def parse_size(text):
+    """Parse a memory size like '512M' or '8G' to bytes"""
+    units = {'': 1, 'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30, 'T': 1 << 40}
+    match = re.match(r'(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?$', text.strip(), re.I)
+    if not match:
+        raise argparse.ArgumentTypeError('Invalid memory size: {}'.format(text))
+    return int(float(match.group(1)) * units[match.group(2).upper()])
+
+
+def derive_outfile(filepath, fmt):
+    """Filepath of the featuresfile of CNF file `filepath` in format `fmt`,
+    like 'f.stats.json' for 'f.cnf' and 'f.cnf.gz'"""
+    base, ext = filepath.rsplit('.', 1)
+    if ext in dimacs.COMPRESSION_EXTENSIONS:
+        base, ext = base.rsplit('.', 1)
+    return base + '.stats.' + fmt
+
+
+def estimate_memory(filepath):
+    """Estimate the memory in bytes required to evaluate the CNF file
+    at `filepath` based on its (uncompressed) file size."""
+    size = os.path.getsize(filepath)
+    if dimacs.detect_compression(filepath):
+        size *= COMPRESSION_RATIO
+    return MEMORY_FACTOR * size
+
+
+def schedule(fn, jobs, units, memory_limit=None):
+    """Run ``fn(*args)`` for all `jobs` in a pool of `units` processes.
+    Jobs are started largest-first. A job is only started if the sum of
+    memory estimates of all running jobs stays within `memory_limit`,
+    but at least one job always runs. Results are yielded in the
+    order jobs finish. If any job raised an exception, the first
+    one is re-raised after all jobs finished.
+
+    :param fn:              function to call in worker processes
+    :type fn:               Callable
+    :param jobs:            pairs of memory estimate and argument list
+    :type jobs:             [(int, list)]
+    :param units:           number of processes to run concurrently
+    :type units:            int
+    :param memory_limit:    memory budget in bytes or None
+    :type memory_limit:     int
+    :return:                generator of argument list and result pairs
+    :rtype:                 generator of (list, object)
+    """
+    pending = sorted(jobs, key=operator.itemgetter(0), reverse=True)
+    finished = queue.Queue()
+    errors = []
+
+    with multiprocessing.Pool(units) as pool:
+        running, used = 0, 0
+        while pending or running:
+            i = 0
+            while i < len(pending) and running < units:
+                estimate, args = pending[i]
+                if running and memory_limit is not None and used + estimate > memory_limit:
+                    i += 1
+                    continue
+                del pending[i]
+                pool.apply_async(
+                    fn, args,
+                    callback=lambda r, e=estimate, a=args: finished.put((e, a, r, None)),
+                    error_callback=lambda x, e=estimate, a=args: finished.put((e, a, None, x))
+                )
+                running += 1
+                used += estimate
+
+            estimate, args, result, error = finished.get()
+            running -= 1
+            used -= estimate
+            if error is None:
+                yield args, result
+            else:
+                errors.append(error)
+
+    if errors:
+        raise errors[0]
+
+
+def collect_range(filepath, start, end, header, ignore_lines='c%', groups=collect.GROUPS,
+                  engine='stream', check_nbvars=False):
+    """Collect the state of features for the clauses in byte range
+    `start` to `end` of the uncompressed CNF file at `filepath`.
+
+    :param filepath:        filepath of DIMACS CNF file
+    :type filepath:         str
+    :param start:           offset of first byte of range
+    :type start:            int
+    :param end:             offset after the last byte of range
+    :type end:              int
+    :param header:          nbvars and nbclauses of the CNF file or None
+                            if the range includes the header line
+    :type header:           (int, int)
+    :return:                state after dispatching all clauses of the range
+    :rtype:                 cnfanalysis.collect.State
+    """
+    with dimacs.RangeReader(filepath, start, end) as fd:
+        reader = dimacs.read_bulk(fd, ignore_lines, check_nbvars=check_nbvars, header=header)
+        if engine == 'vectorized':
+            state = collect.VectorizedState(groups)
+            state.consume(dimacs.CNF.from_reader(reader))
+        else:
+            state = collect.State(groups)
+            header_fns, clause_fns, literal_fns = collect.collectors(groups)
+            collect.dispatch_bulk(reader, state, header_fns, clause_fns, literal_fns)
+    return state
+
+
+def collect_sharded(filepath, shards, ignore_lines='c%', groups=collect.GROUPS,
+                    engine='stream', check_nbvars=False, hashes=False):
+    """Collect the state of features of one uncompressed CNF file with
+    `shards` processes. Each process dispatches a range of clauses,
+    the partial states are merged in order. Hashes are computed
+    with one more process reading the entire file.
+
+    :return:                merged state and metadata with hashes
+    :rtype:                 (cnfanalysis.collect.State, dict)
+    """
+    header, ranges = dimacs.split_ranges(filepath, shards, ignore_lines)
+    if len(ranges) < 2:
+        # nothing to split, read the file including its header in one range
+        header, ranges = None, [(0, os.path.getsize(filepath))]
+    with multiprocessing.Pool(len(ranges) + bool(hashes)) as pool:
+        if hashes:
+            digests = pool.apply_async(stats.file_hashes, (filepath, 1 << 20, ignore_lines))
+        partials = [pool.apply_async(collect_range, (filepath, start, end, header, ignore_lines,
+                                                     groups, engine, check_nbvars))
+                    for start, end in ranges]
+        state = partials[0].get()
+        for partial in partials[1:]:
+            state.merge(partial.get())
+        meta = {}
+        if hashes:
+            md5sum, sha1sum, cnf_hash = digests.get()
+            meta = {"@md5sum": md5sum, "@sha1sum": sha1sum, "@cnfhash": cnf_hash}
+    return state, meta
 
 
 def main():
     parser = argparse.ArgumentParser(description='CNF analysis')
     parser.add_argument('dimacsfiles', metavar='dimacsfiles', nargs='+',
                         help='filepath of DIMACS file')
-    parser.add_argument('-f', '--format', choices={'json', 'xml'}, default='json',
+    parser.add_argument('-f', '--format', choices={'json', 'jsonl', 'xml'}, default='json',
                         help='format to store feature data in')
+    parser.add_argument('-o', '--output', metavar='FILE',
+                        help='write the features of all CNF files to FILE '
+                             '(requires "-f jsonl" or "-f xml")')
     parser.add_argument('--ignore', action='append',
                         help='a prefix for lines that shall be ignored (like "c")')
     parser.add_argument('-u', '--units', type=int, default=os.cpu_count() or 1,
@@ -39,21 +195,179 @@ def main():
                         help='use full path instead of basename in featurefiles')
     parser.add_argument('-s', '--skip-existing', action='store_true',
                         help='skip CNF file if file.stats.json exists')
+    parser.add_argument('-e', '--engine', choices={'stream', 'vectorized'}, default='stream',
+                        help='feature engine: "stream" dispatches clause by clause, '
+                             '"vectorized" loads the entire CNF and uses batched operations')
+    parser.add_argument('--features',
+                        help='comma-separated feature names, patterns like "clauses_length_*" '
+                             'or groups ({}) to compute; default: all'
+                             .format(', '.join(collect.GROUPS)))
+    parser.add_argument('-m', '--memory-limit', type=parse_size,
+                        help='memory available for all units like "8G"; CNF files are '
+                             'started largest-first while their estimated memory fits')
+    parser.add_argument('--memory-budget', type=parse_size,
+                        help='memory available for evaluating one CNF file like "2G"; if '
+                             'the memory projected from its header exceeds it, arrays are '
+                             'stored in temporary files and features retaining clauses '
+                             'are skipped')
+    parser.add_argument('--cache', action='store_true',
+                        help='look up and store features in a cache addressed by the '
+                             'SHA1 digest of CNF files, which reads files not cached twice')
+    parser.add_argument('--cache-path', metavar='DBFILE',
+                        help='filepath of the cache database, implies --cache; '
+                             'default: {}'.format(cache.default_path()))
+    parser.add_argument('--cache-size', type=parse_size, default=cache.DEFAULT_MAX_SIZE,
+                        help='maximum size of cached feature data like "1G"')
+    parser.add_argument('--corpus', metavar='TABLE',
+                        help='write features of all CNF files as rows of one table '
+                             '(.csv or .parquet) instead of one features file each')
+    parser.add_argument('--split-files', action='store_true',
+                        help='evaluate one CNF file after another, each split into '
+                             'ranges of clauses evaluated by all units')
+    parser.add_argument('--profile', action='store_true',
+                        help='record time and calls of every collector function, print '
+                             'progress to stderr and store the measurements as @timing '
+                             'metadata')
+    parser.add_argument('--profile-interval', type=float, metavar='SECONDS',
+                        help='print progress every SECONDS, implies --profile; default: 60')
+    parser.add_argument('--checkpoint-clauses', type=int, metavar='N',
+                        help='store the state of evaluating FILE in FILE{} every N '
+                             'clauses and resume from it after a crash'
+                             .format(checkpoints.EXTENSION))
+    parser.add_argument('--checkpoint-seconds', type=float, metavar='SECONDS',
+                        help='like --checkpoint-clauses, but every SECONDS seconds')
+    parser.add_argument('--convert', action='store_true',
+                        help='instead of evaluating features, write a binary sidecar '
+                             'FILE{} of every CNF file, which later runs load '
+                             'instead of parsing FILE'.format(binary.EXTENSION))
 
-    # TODO: support gzipped files
+    args = parser.parse_args()
+    selection = None
+    if args.features:
+        selection = [f.strip() for f in args.features.split(',') if f.strip()]
+        try:
+            collect.feature_groups(selection)
+        except ValueError as e:
+            parser.error(str(e))
 
-    def derive_outfile(filepath, fmt):
-        base, ext = filepath.rsplit('.', 1)
-        if ext == 'gz':
-            base, ext = base.rsplit('.', 1)
-        return base + '.stats.' + fmt
+    ignore_lines = ''.join(args.ignore or ['%', 'c'])
+    if args.convert:
+        jobs = [(estimate_memory(i), [i, ignore_lines]) for i in args.dimacsfiles]
+        for job, sidecar in schedule(convert_file, jobs, args.units, args.memory_limit):
+            pass
+        return
 
-    args = parser.parse_args()
-    arguments = [args.format, ''.join(args.ignore or ['%', 'c']), args.fullpath,
-                 not args.no_hashes, args.skip_existing]
-    with multiprocessing.Pool(args.units) as p:
-        p.starmap(evaluate_file, [[i, derive_outfile(i, args.format)] + arguments
-                                  for i in args.dimacsfiles])
+    arguments = [args.format, ignore_lines, args.fullpath, not args.no_hashes, args.skip_existing]
+    if args.output and args.format == 'json':
+        parser.error('--output requires "--format jsonl" or "--format xml"')
+    if args.memory_budget is not None and args.engine == 'vectorized':
+        parser.error('--memory-budget requires "--engine stream", the vectorized '
+                     'engine loads the entire CNF into memory')
+    if (args.checkpoint_clauses or args.checkpoint_seconds) and args.engine == 'vectorized':
+        parser.error('checkpoints require "--engine stream"')
+    if args.corpus:
+        try:
+            stats.corpus_format(args.corpus)
+        except ValueError as e:
+            parser.error(str(e))
+
+    def outfile(filepath):
+        # records are returned to this process for corpus tables and XML documents
+        if args.corpus or (args.output and args.format == 'xml'):
+            return None
+        return args.output or derive_outfile(filepath, args.format)
+
+    profile_interval = None
+    if args.profile or args.profile_interval is not None:
+        profile_interval = args.profile_interval or 60.0
+    cache_path = None
+    if args.cache or args.cache_path:
+        cache_path = args.cache_path or cache.default_path()
+
+    jobs = [(estimate_memory(i), [i, outfile(i)] + arguments) for i in args.dimacsfiles]
+    options = {'engine': args.engine, 'selection': selection,
+               'cache_path': cache_path, 'cache_size': args.cache_size,
+               'profile_interval': profile_interval, 'memory_budget': args.memory_budget,
+               'checkpoint_clauses': args.checkpoint_clauses,
+               'checkpoint_seconds': args.checkpoint_seconds}
+    if args.split_files:
+        # pool processes cannot start processes, hence files are evaluated sequentially
+        jobs.sort(key=operator.itemgetter(0), reverse=True)
+        results = ((job, evaluate_file(*job, shards=args.units, **options))
+                   for estimate, job in jobs)
+    else:
+        evaluate_fn = functools.partial(evaluate_file, **options)
+        results = schedule(evaluate_fn, jobs, args.units, args.memory_limit)
+
+    if args.corpus:
+        target, writer = args.corpus, stats.CorpusWriter(args.corpus)
+    elif args.output and args.format == 'xml':
+        target, writer = args.output, stats.XMLWriter(args.output)
+    else:
+        for job, record in results:
+            pass
+        return
+    # records are written in the order files finish
+    with writer:
+        for job, record in results:
+            if record is not None:
+                writer.write(record)
+    print('{} - {} written'.format(datetime.datetime.now().isoformat(), target))
+
+
+def add_tags(current, tags):
+    """Append all `tags` missing in the space-separated tags `current`"""
+    present = (current or '').split()
+    missing = [t for t in tags if t not in present]
+    return ' '.join(present + missing) if missing else current
+
+
+def annotate_file(statsfile, crits, tags):
+    """Add `tags` to @tags of all records in featuresfile `statsfile`
+    meeting criteria `crits`. The file is only written if any
+    tag was added.
+
+    :param statsfile:   filepath of featuresfile
+    :type statsfile:    str
+    :param crits:       criteria as returned by :func:`criteria.parse`
+    :type crits:        [(str, str, object)]
+    :param tags:        tags to add
+    :type tags:         [str]
+    :return:            number of records tagged
+    :rtype:             int
+    """
+    predicate = criteria.compile(crits)
+    fmt = stats.detect_format(statsfile)
+    records = list(stats.read(statsfile, fmt))
+    changed = 0
+    for record in records:
+        if not predicate(record):
+            continue
+        updated = add_tags(record.get('@tags'), tags)
+        if updated != record.get('@tags'):
+            record['@tags'] = updated
+            changed += 1
+    if changed:
+        stats.write_records(statsfile, records, fmt)
+    return changed
+
+
+def annotate_corpus(table, crits, tags):
+    """Add `tags` to the @tags column of all rows of corpus table
+    `table` meeting criteria `crits`.
+
+    :return:            number of rows tagged
+    :rtype:             int
+    """
+    columns = stats.read_corpus(table)
+    current = columns['@tags']
+    updated = [add_tags(c, tags) if m else c
+               for c, m in zip(current, criteria.mask(crits, columns))]
+    changed = sum(map(operator.ne, current, updated))
+    if changed:
+        columns['@tags'] = updated
+        stats.write_corpus(table, columns)
+    return changed
 
 
 def annotate():
@@ -63,100 +377,180 @@ def annotate():
                         help='criterion which has to be met')
     parser.add_argument('-t', '--tag', action='append',
                         help='tag to annotate, i.e. append to @tags')
+    parser.add_argument('-u', '--units', type=int, default=os.cpu_count() or 1,
+                        help='how many units (= processes) should run in concurrently')
     parser.add_argument('statsfiles', nargs='+',
-                        help='feature files to annotate')
+                        help='feature files or corpus tables (.csv, .parquet) to annotate')
 
     args = parser.parse_args()
 
-    def parse_criterion(crit):
-        op = None
-        for o in {'==', '!=', '>', '<'}:
-            if o in crit:
-                op = o
-        if op is None:
-            raise ValueError('No operator like {==,!=,>,<} found in criterion')
-        feature, op, val = crit.split(op)
-        if val.lower() in {'true', 'false'}:
-            val = True if val.lower() == 'true' else False
-        elif val.lower() == 'nan' or re.search(r'[+-]?(\d+(\.\d*)?|\.\d+)([eE][+-]?\d+)?', val):
-            val = float(val)
-        elif re.search(r'\d+', val):
-            val = int(val)
-        else:
-            val = str(val)
-        op = {'==': operator.eq, '!=': operator.ne, '>': operator.gt, '<': operator.lt}[op]
-        print('Considering criterion: {}'.format((feature.strip(), op, val)), file=sys.stderr)
-        return feature.strip(), op, val
-
     if not args.tag:
         raise ValueError('Expected at least one tag to be provided with "-t TAG"')
 
-    if args.criterion:
-        crits = [parse_criterion(c) for c in args.criterion]
-    else:
-        crits = []
-    tags = ' '.join(args.tag)
-    for statsfile in args.statsfiles:
-        with open(statsfile) as fd:
-            data = json.load(fd)
-        for cnf in data:
-            # check criteria
-            met = True
-            for (feature, op, value) in crits:
-                if feature.startswith('@'):
-                    if not op(cnf[feature], value):
-                        met = False
-                else:
-                    if not op(cnf['featuring'][feature], value):
-                        met = False
-            if not met:
-                continue
-            # add tags
-            if '@tags' not in cnf:
-                cnf['@tags'] = tags
-            else:
-                cnf['@tags'] += ' ' + tags
-        # write statsfile
-        with open(statsfile, 'w') as fd:
-            json.dump(data, fd, indent=2, sort_keys=True)
-            print('Updated: {}'.format(statsfile), file=sys.stderr)
+    crits = []
+    for c in args.criterion or []:
+        crits.append(criteria.parse(c))
+        print('Considering criterion: {}'.format(crits[-1]), file=sys.stderr)
+    tags = ' '.join(args.tag).split()
+
+    statsfiles, tables = [], []
+    for filepath in args.statsfiles:
+        if filepath.lower().endswith(('.csv', '.parquet')):
+            tables.append(filepath)
+        else:
+            statsfiles.append(filepath)
+
+    for table in tables:
+        if annotate_corpus(table, crits, tags):
+            print('Updated: {}'.format(table), file=sys.stderr)
+
+    annotate_fn = functools.partial(annotate_file, crits=crits, tags=tags)
+    with multiprocessing.Pool(args.units) as pool:
+        for statsfile, changed in zip(statsfiles, pool.imap(annotate_fn, statsfiles, 16)):
+            if changed:
+                print('Updated: {}'.format(statsfile), file=sys.stderr)
+
+
+def query():
+    desc = 'Select CNF files by their features. Syntax for criteria: "<feature>{==,!=,>,<}<value>"'
+    parser = argparse.ArgumentParser(description=desc)
+    parser.add_argument('-c', '--criterion', action='append',
+                        help='criterion which has to be met')
+    parser.add_argument('--index', default=index.default_path(),
+                        help='filepath of the index database')
+    parser.add_argument('-s', '--sources', action='store_true',
+                        help='print featuresfiles instead of CNF filenames')
+    parser.add_argument('statsfiles', nargs='*',
+                        help='feature files to index and query, default: all indexed files')
+
+    args = parser.parse_args()
+    try:
+        crits = [criteria.parse(c) for c in args.criterion or []]
+    except ValueError as e:
+        parser.error(str(e))
+
+    with index.FeatureIndex(args.index) as db:
+        db.prune()
+        if args.statsfiles:
+            updated = db.update(args.statsfiles)
+            print('Indexed {} feature files'.format(updated), file=sys.stderr)
+        try:
+            rows = db.query(crits, args.statsfiles or None)
+        except ValueError as e:
+            parser.error(str(e))
 
+    if args.sources:
+        rows = sorted(set((source, source) for source, filename in rows))
+    for source, filename in rows:
+        print(filename)
 
-def evaluate_file(filepath, *args, **kwargs):
-    oldpath = os.path.splitext(filepath)[0] + ".stats.json"
-    if os.path.exists(oldpath):
-        skip_existing = args[5]
+
+def cache_command():
+    parser = argparse.ArgumentParser(description='Maintain the cache of CNF features')
+    parser.add_argument('--path', default=cache.default_path(),
+                        help='filepath of the cache database')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.add_parser('info', help='show location, number of entries and size')
+    prune = subparsers.add_parser('prune', help='evict least recently used entries')
+    prune.add_argument('max_size', type=parse_size,
+                       help='size of feature data to keep like "100M"')
+    clear = subparsers.add_parser('clear', help='remove entries')
+    clear.add_argument('--outdated', action='store_true',
+                       help='only remove entries of previous feature versions')
+
+    args = parser.parse_args()
+    with cache.FeatureCache(args.path, max_size=None) as db:
+        if args.command == 'prune':
+            print('Evicted {} entries'.format(db.prune(args.max_size)))
+        elif args.command == 'clear':
+            print('Removed {} entries'.format(db.clear(args.outdated)))
+        else:
+            count, size = db.size()
+            print('Cache: {}'.format(db.path))
+            print('Entries: {}'.format(count))
+            print('Size: {} bytes'.format(size))
+
+
+def convert_file(filepath, ignore_lines='c%'):
+    """Write the binary sidecar of CNF file `filepath`
+    and return the filepath of the sidecar"""
+    try:
+        sidecar = binary.convert(filepath, ignore_lines=ignore_lines)
+    except Exception as e:
+        print("Error while converting {}".format(filepath), file=sys.stderr)
+        raise e
+    print('{} - {} written'.format(datetime.datetime.now().isoformat(), sidecar))
+    return sidecar
+
+
+def evaluate_file(filepath, outfile, format=None, ignore_lines='c%', fullpath=False,
+                  hashes=True, skip_existing=False, cache_path=None,
+                  cache_size=cache.DEFAULT_MAX_SIZE, profile_interval=None,
+                  checkpoint_clauses=None, checkpoint_seconds=None, **kwargs):
+    # `outfile` is the featuresfile written, see derive_outfile
+    if outfile is not None and format != 'jsonl' and os.path.exists(outfile):
         if skip_existing:
             return
         else:
-            import datetime
             import shutil
             backupsuffix = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-            newname = "{}.backup{}.stats.json".format(filepath, backupsuffix)
-            shutil.move(oldpath, newname)
+            newname = "{}.backup{}.stats.{}".format(filepath, backupsuffix, format or 'json')
+            shutil.move(outfile, newname)
             warning = "Moved {} to {} to avoid name collision"
-            print(warning.format(oldpath, newname), file=sys.stderr)
-    args = args[0:5]
+            print(warning.format(outfile, newname), file=sys.stderr)
+
+    features_cache = None
+    if cache_path and not cache.cacheable(ignore_lines):
+        print('{} - features of {} are not cached, because prefixes of ignored lines '
+              'differ from "{}"'.format(datetime.datetime.now().isoformat(), filepath,
+                                         cache.IGNORE_LINES), file=sys.stderr)
+    elif cache_path:
+        features_cache = cache.FeatureCache(cache_path, cache_size)
+
+    profile, raw = None, None
+    if profile_interval is not None:
+        # progress is measured in (compressed) bytes of the file
+        profile = profiling.Profile(filepath, os.path.getsize(filepath), profile_interval)
+        raw = profile.counting(open(filepath, 'rb'))
+
+    checkpoint = None
+    if checkpoint_clauses or checkpoint_seconds:
+        checkpoint = checkpoints.Checkpoint(checkpoints.checkpoint_path(filepath), filepath,
+                                            ignore_lines, checkpoint_clauses, checkpoint_seconds)
 
-    with open(filepath, encoding="utf-8") as fd:
+    with dimacs.open_cnf(filepath, raw) as fd:
         try:
             kwags = dict(kwargs)
             kwags['fd_fp'] = filepath
-            return evaluate(fd, *args, **kwags)
+            kwags['cache'] = features_cache
+            kwags['profile'] = profile
+            kwags['checkpoint'] = checkpoint
+            return evaluate(fd, outfile, format, ignore_lines, fullpath, hashes, **kwags)
         except Exception as e:
             print("Error while processing {}".format(filepath), file=sys.stderr)
             raise e
+        finally:
+            if features_cache is not None:
+                features_cache.close()
+            if raw is not None:
+                raw.close()
 
 
-def evaluate(fd, outfile, format=None, ignore_lines='c%', fullpath=False, hashes=True, fd_fp=""):
+def evaluate(fd, outfile, format=None, ignore_lines='c%', fullpath=False, hashes=True, fd_fp="",
+             engine='stream', selection=None, shards=1, cache=None, profile=None,
+             memory_budget=None, checkpoint=None):
     """Evaluate cnfanalysis features for the CNF file provided
     in file descriptor `fd` and write features to filepath `outfile`.
+    Return the metadata and features as dictionary.
+    If a sidecar of file `fd_fp` written by :func:`convert_file` is
+    up to date, the CNF is loaded from it instead of parsing `fd`.
 
-    :param fd:              file descriptor to read from
+    :param fd:              file descriptor to read bytes from
     :type fd:               file descriptor
-    :param outfile:         file path to write to
+    :param outfile:         file path to write to, None to only
+                            return the features
     :type outfile:          str
-    :param format:          desired format of outfile: 'xml' or 'json'
+    :param format:          desired format of outfile: 'xml', 'json' or 'jsonl'
     :type format:           str
     :param ignore_lines:    a string of prefixes of lines to ignore,
                             e.g. 'c' means ignore all lines starting with 'c'
@@ -167,20 +561,162 @@ def evaluate(fd, outfile, format=None, ignore_lines='c%', fullpath=False, hashes
     :type hashes:           bool
     :param fd_fp:           filepath of file descriptor
     :type fd_fp:            str
+    :param engine:          'stream' to dispatch clause by clause or 'vectorized'
+                            to load the entire CNF and use batched operations
+    :type engine:           str
+    :param selection:       feature names, patterns or groups to compute,
+                            None computes all features
+    :type selection:        [str]
+    :param shards:          number of processes to split the clauses of
+                            an uncompressed file `fd_fp` into
+    :type shards:           int
+    :param cache:           cache to look up and store features of file `fd_fp`.
+                            File `fd_fp` is hashed before the lookup, hence on a
+                            cache miss it is read before `fd` is parsed.
+    :type cache:            cnfanalysis.cache.FeatureCache
+    :param profile:         profile to record time and calls of collector
+                            functions in and to store as '@timing' metadata
+    :type profile:          cnfanalysis.profiling.Profile
+    :param memory_budget:   memory available for the state of the stream engine
+                            in bytes or None. If exceeded, features skipped are
+                            listed in '@skipped_features' metadata. Does not
+                            apply to the vectorized engine and split files.
+    :type memory_budget:    int
+    :param checkpoint:      checkpoint to resume the stream engine from and to
+                            store its state in while reading `fd`. It is removed
+                            after the features were computed. Hashes of a resumed
+                            analysis are computed by reading file `fd_fp` again.
+    :type checkpoint:       cnfanalysis.checkpoint.Checkpoint
     """
-    print('{} - {} starting'.format(datetime.datetime.now().isoformat(), outfile))
-    reader = dimacs.read(fd, ignore_lines)
-    state = collect.State()
-    header_fns = [collect.header_features]
-    clause_fns = [collect.linear_clause_features, collect.expensive_clause_features]
-    literal_fns = [collect.linear_literal_features, collect.expensive_literal_features]
-
-    collect.dispatch(reader, state, header_fns, clause_fns, literal_fns)
-
-    features = state.finalize()
-    if format == 'json' or not format:
-        stats.write_json(outfile, features, sourcefile=fd_fp, fullpath=fullpath, hashes=hashes)
+    name = outfile or fd_fp
+    print('{} - {} starting'.format(datetime.datetime.now().isoformat(), name))
+    groups = collect.feature_groups(selection)
+    # literals are range-checked by the linear collectors, otherwise by the reader
+    check_nbvars = 'linear' not in groups
+    if profile is not None:
+        section = profile.section
+    else:
+        section = lambda name: contextlib.nullcontext()
+    cached = None
+    digests = None
+    if cache is not None and fd_fp:
+        with section('cache'):
+            digests = stats.md5sha1hashes(fd_fp)
+            cached = cache.get(digests[1], groups, hashes)
+
+    sidecar = None
+    sidecar_fp = binary.sidecar_path(fd_fp) if fd_fp else None
+    if cached is None and shards <= 1 and sidecar_fp and os.path.exists(sidecar_fp):
+        with section('sidecar'):
+            sidecar = binary.load_fresh(sidecar_fp, fd_fp, ignore_lines, digests)
+        # the text reader raises the error of an invalid cnfhash
+        if sidecar is None or (hashes and '@cnfhash' not in sidecar[1]):
+            print('{} - {} is stale, parsing {}'.format(datetime.datetime.now().isoformat(),
+                  sidecar_fp, fd_fp), file=sys.stderr)
+            sidecar = None
+
+    if cached is not None:
+        all_features, meta = cached
+        if not hashes:
+            meta = {}
+        print('{} - {} found in cache'.format(datetime.datetime.now().isoformat(), name))
+    elif shards > 1 and fd_fp and not dimacs.detect_compression(fd_fp):
+        # collectors run in other processes and are not profiled individually
+        with section('collect_sharded'):
+            state, meta = collect_sharded(fd_fp, shards, ignore_lines, groups,
+                                          engine, check_nbvars, hashes)
+        if profile is not None:
+            profile.bytes = profile.total
+    elif sidecar is not None:
+        cnf, meta = sidecar
+        if engine == 'vectorized':
+            state = collect.VectorizedState(groups)
+            with section('consume'):
+                state.consume(cnf)
+        else:
+            state = collect.State(groups, memory_budget)
+            header_fns, clause_fns, literal_fns = collect.collectors(groups)
+            if profile is not None:
+                header_fns, clause_fns, literal_fns = profile.collectors(
+                    header_fns, clause_fns, literal_fns)
+            collect.dispatch_cnf(cnf, state, header_fns, clause_fns, literal_fns)
+        if not hashes:
+            meta = {}
+        if profile is not None:
+            profile.bytes = profile.total
+    else:
+        resumed, header = None, None
+        if checkpoint is not None and engine == 'stream':
+            resumed = checkpoint.resume(groups, memory_budget)
+            if resumed is not None:
+                header = (resumed.nbvars, resumed.nbclauses)
+                print('{} - {} resuming after {} clauses'.format(
+                      datetime.datetime.now().isoformat(), name, checkpoint.clauses))
+            fd = checkpoint.reader(fd)
+        if hashes and resumed is None:
+            # hash digests and features are computed with one pass over `fd`
+            hashed = stats.HashedReader(fd, ignore_lines, check_nbvars=check_nbvars)
+            reader = iter(hashed)
+        else:
+            reader = dimacs.read_bulk(fd, ignore_lines, check_nbvars=check_nbvars, header=header)
+        if profile is not None:
+            reader = profile.iterate(reader)
+        if engine == 'vectorized':
+            state = collect.VectorizedState(groups)
+            cnf = dimacs.CNF.from_reader(reader)
+            with section('consume'):
+                state.consume(cnf)
+        else:
+            state = collect.State(groups, memory_budget) if resumed is None else resumed
+            header_fns, clause_fns, literal_fns = collect.collectors(groups)
+            if resumed is not None:
+                # the arrays allocated for the header are part of the checkpoint
+                header_fns = []
+            if profile is not None:
+                header_fns, clause_fns, literal_fns = profile.collectors(
+                    header_fns, clause_fns, literal_fns)
+            if checkpoint is not None:
+                reader = checkpoint.iterate(reader, state)
+
+            collect.dispatch_bulk(reader, state, header_fns, clause_fns, literal_fns)
+        if resumed is not None and hashes:
+            md5sum, sha1sum, cnf_hash = stats.file_hashes(fd_fp, ignore_lines=ignore_lines)
+            meta = {"@md5sum": md5sum, "@sha1sum": sha1sum, "@cnfhash": cnf_hash}
+        else:
+            meta = hashed.metadata() if hashes else {}
+
+    skipped = []
+    if cached is None:
+        with section('finalize'):
+            all_features = state.finalize()
+        skipped = list(collect.select_features(dict.fromkeys(state.skipped_features), selection))
+        if state.disk_backed:
+            print('{} - {} exceeds memory budget, arrays were stored in temporary files'
+                  .format(datetime.datetime.now().isoformat(), name), file=sys.stderr)
+        if checkpoint is not None:
+            checkpoint.remove()
+        # incomplete features are not cached
+        if cache is not None and fd_fp and not state.skipped_features:
+            cache.put(digests[1], groups, all_features, meta)
+    features = collect.select_features(all_features, selection)
+    if skipped:
+        print('{} - {} exceeds memory budget, skipped features: {}'.format(
+              datetime.datetime.now().isoformat(), name, ', '.join(skipped)), file=sys.stderr)
+        meta = dict(meta, **{"@skipped_features": skipped})
+    if profile is not None:
+        profile.report(force=True)
+        meta = dict(meta, **profile.metadata())
+    if outfile is None:
+        record = stats.extend_metadata(features, sourcefile=fd_fp, fullpath=fullpath)[0]
+        record.update(meta)
+        print('{} - {} done'.format(datetime.datetime.now().isoformat(), name))
+        return record
+    elif format == 'json' or not format:
+        record = stats.write_json(outfile, features, sourcefile=fd_fp, fullpath=fullpath, meta=meta)
+    elif format == 'jsonl':
+        record = stats.write_jsonl(outfile, features, sourcefile=fd_fp, fullpath=fullpath, meta=meta)
     else:
-        stats.write_xml(outfile, features, sourcefile=fd_fp, fullpath=fullpath, hashes=hashes)
+        record = stats.write_xml(outfile, features, sourcefile=fd_fp, fullpath=fullpath, meta=meta)
 
     print('{} - {} written'.format(datetime.datetime.now().isoformat(), outfile))
+    return record
@@ -9,16 +9,20 @@
     (C) 2015-2016, CC-0 licensed, Lukas Prokop
 """
 
+import csv
 import json
 import os.path
 import hashlib
 import datetime
 
 import xml.dom.minidom
-import xml.etree.ElementTree
 
 import xml.sax.saxutils
 import xml.sax.handler
+import xml.parsers.expat
+
+from . import dimacs
+from . import collect
 
 
 def detect_format(filepath):
@@ -29,33 +33,50 @@ def detect_format(filepath):
 
     :param filepath:        Read one byte from this filepath to detect format
     :type filepath:         str
-    :return:                'xml', 'json' or None (empty file)
+    :return:                'xml', 'json', 'jsonl' or None (empty file)
     :rtype:                 str | None
     """
-    if filepath.endswith('.stats.xml'):
-        return 'xml'
-    if filepath.endswith('.stats.json'):
-        return 'json'
-
-    try:
-        with open(filepath, 'r') as fp:
+    if isinstance(filepath, str):
+        for fmt in ('xml', 'json', 'jsonl'):
+            if filepath.endswith('.stats.' + fmt):
+                return fmt
+        with open(filepath, 'rb') as fp:
             by = fp.read(1)
-    except TypeError:
+    else:
         # assume filepath is file descriptor
-        by = fp.read(1)
-        fp.seek(-1, 1)
+        pos = filepath.tell()
+        by = filepath.read(1)
+        filepath.seek(pos)
 
+    if isinstance(by, str):
+        by = by.encode('utf-8')
     if by == b'<':
         return 'xml'
+    elif by == b'{':
+        return 'jsonl'
     elif by == b'':
         return None
     else:
         return 'json'
 
 
-def md5sha1hashes(sourcefile, blocksize=4096):
+def _read_blockwise(sourcefile, blocksize, digests=()):
+    """Yield blocks of the decompressed content of `sourcefile`
+    and update all `digests` with them"""
+    with dimacs.open_cnf(sourcefile) as fd:
+        while True:
+            buf = fd.read(blocksize)
+            if len(buf) == 0:
+                break
+            for digest in digests:
+                digest.update(buf)
+            yield buf
+
+
+def md5sha1hashes(sourcefile, blocksize=1 << 20):
     """Compute MD5 and SHA1 digests simultaneously of the file
-    given at filepath `sourcefile`
+    given at filepath `sourcefile`. Compressed files are hashed
+    by their decompressed content.
 
     :param sourcefile:      source file path
     :type sourcefile:       str
@@ -66,28 +87,136 @@ def md5sha1hashes(sourcefile, blocksize=4096):
     """
     md5 = hashlib.md5()
     sha1 = hashlib.sha1()
-    with open(sourcefile, 'rb') as fd:
-        buf = fd.read(blocksize)
-        while len(buf):
-            md5.update(buf)
-            sha1.update(buf)
-            buf = fd.read(blocksize)
-        return (md5.hexdigest(), sha1.hexdigest())
+    for buf in _read_blockwise(sourcefile, blocksize, (md5, sha1)):
+        pass
+    return (md5.hexdigest(), sha1.hexdigest())
 
 
-def cnf2hash(sourcefile, blocksize=4096):
-    """Compute cnfhash of given CNF files"""
+def cnf2hash(sourcefile, blocksize=1 << 20):
+    """Compute cnfhash of given (possibly compressed) CNF files"""
     import cnfhash
 
-    def read_blockwise(filepath):
-        with open(filepath, 'rb') as fd:
-            while True:
-                buf = fd.read(blocksize)
-                if len(buf) == 0:
-                    break
-                yield buf
+    return cnfhash.hash_dimacs(_read_blockwise(sourcefile, blocksize))
+
+
+class DigestReader:
+    """Wraps a binary file object. Every block read
+    from it updates the given hashlib `digests`.
+    """
+
+    def __init__(self, fd, *digests):
+        self.fd = fd
+        self.digests = digests
+
+    def read(self, size=-1):
+        buf = self.fd.read(size)
+        for digest in self.digests:
+            digest.update(buf)
+        return buf
 
-    return cnfhash.hash_dimacs(read_blockwise(sourcefile))
+
+class CnfHash:
+    """Incremental cnfhash computation from parsed clauses. The result
+    equals ``cnfhash.hash_cnf`` for the integers of the clauses given.
+    A final clause missing its terminating zero is hashed as if it
+    were terminated.
+    """
+
+    def __init__(self, nbvars, nbclauses):
+        if nbvars <= 0:
+            raise ValueError("nbvars must be non-negative, is {}".format(nbvars))
+        if nbclauses <= 0:
+            raise ValueError("nbclauses must be non-negative, is {}".format(nbclauses))
+        self.nbvars = nbvars
+        self.nbclauses = nbclauses
+        self.clauses = 0
+        self.sha1 = hashlib.sha1()
+
+    def update(self, literals, offsets):
+        """Hash a block of clauses as yielded by
+        :func:`cnfanalysis.dimacs.read_bulk`"""
+        if literals and not (-self.nbvars <= min(literals) and max(literals) <= self.nbvars):
+            lit = next(l for l in literals if not (-self.nbvars <= l <= self.nbvars))
+            tmpl = "Variable {} outside range ({})--({})"
+            raise ValueError(tmpl.format(lit, -self.nbvars, self.nbvars))
+
+        view = memoryview(literals)
+        clauses = []
+        begin = offsets[0]
+        for end in offsets[1:]:
+            if begin != end:
+                clauses.append(' '.join(map(str, view[begin:end])) + ' 0\n')
+            elif self.clauses + len(clauses) == 0:
+                # consecutive zeros are truncated to a single one
+                clauses.append('0\n')
+            begin = end
+        self.clauses += len(clauses)
+        self.sha1.update(''.join(clauses).encode('ascii'))
+
+    def hexdigest(self):
+        """Return the cnfhash of all clauses hashed"""
+        if self.nbclauses != self.clauses:
+            tmpl = "Invalid number of clauses, expected {}, got {} clauses"
+            raise ValueError(tmpl.format(self.nbclauses, self.clauses))
+        return 'cnf2$' + self.sha1.hexdigest()
+
+
+class HashedReader:
+    """Reads a DIMACS CNF file with :func:`cnfanalysis.dimacs.read_bulk`
+    and computes MD5, SHA1 and cnfhash along. Every block is read once and
+    passed to the digests and the tokenizer. Iterate over this object like
+    over the generator returned by ``read_bulk``, then call :meth:`hashes`.
+    """
+
+    def __init__(self, fd, ignore_lines='c%', **kwargs):
+        self.md5 = hashlib.md5()
+        self.sha1 = hashlib.sha1()
+        self.cnfhash = None
+        self.reader = dimacs.read_bulk(DigestReader(fd, self.md5, self.sha1),
+                                       ignore_lines, **kwargs)
+
+    def __iter__(self):
+        nbvars = next(self.reader)
+        nbclauses = next(self.reader)
+        self.cnfhash = CnfHash(nbvars, nbclauses)
+        yield nbvars
+        yield nbclauses
+        for literals, offsets in self.reader:
+            self.cnfhash.update(literals, offsets)
+            yield literals, offsets
+
+    def hashes(self):
+        """After reading the entire file, return MD5 digest,
+        SHA1 digest and cnfhash.
+
+        :rtype:     (str, str, str)
+        """
+        return (self.md5.hexdigest(), self.sha1.hexdigest(), self.cnfhash.hexdigest())
+
+    def metadata(self):
+        """Return hashes as metadata entries of a featuresfile"""
+        md5sum, sha1sum, cnf_hash = self.hashes()
+        return {"@md5sum": md5sum, "@sha1sum": sha1sum, "@cnfhash": cnf_hash}
+
+
+def file_hashes(sourcefile, blocksize=1 << 20, ignore_lines='c%'):
+    """Compute MD5, SHA1 and cnfhash of the file given at filepath
+    `sourcefile` with one pass over its (decompressed) content.
+
+    :param sourcefile:      source file path
+    :type sourcefile:       str
+    :param blocksize:       blocksize for blockwise reading
+    :type blocksize:        int
+    :param ignore_lines:    prefixes of lines to ignore for the cnfhash
+    :type ignore_lines:     str
+    :return:                MD5 digest, SHA1 digest, cnfhash
+    :rtype:                 (str, str, str)
+    """
+    with dimacs.open_cnf(sourcefile) as fd:
+        reader = HashedReader(fd, ignore_lines, chunk_size=blocksize)
+        for block in reader:
+            pass
+    return reader.hashes()
 
 
 def extend_metadata(feature_data, sourcefile='', fullpath=False, hashes=False):
@@ -119,10 +248,10 @@ def extend_metadata(feature_data, sourcefile='', fullpath=False, hashes=False):
         else:
             data[0]["@filename"] = os.path.basename(sourcefile)
         if hashes:
-            md5sum, sha1sum = md5sha1hashes(sourcefile)
+            md5sum, sha1sum, cnf_hash = file_hashes(sourcefile)
             data[0]["@md5sum"] = md5sum
             data[0]["@sha1sum"] = sha1sum
-            data[0]["@cnfhash"] = cnf2hash(sourcefile)
+            data[0]["@cnfhash"] = cnf_hash
 
     return data
 
@@ -146,6 +275,8 @@ def write_json(filepath, feature_data, sourcefile='', fullpath=False,
     :type mode:             str
     :param meta:            meta attributes to overwrite metadata
     :type meta:             dict
+    :return:                metadata and features written
+    :rtype:                 dict
     """
     data = extend_metadata(feature_data, sourcefile, fullpath, hashes)
     data[0].update(meta)
@@ -153,9 +284,92 @@ def write_json(filepath, feature_data, sourcefile='', fullpath=False,
     with open(filepath, mode, encoding='utf-8') as fd:
         json.dump(data, fd, indent=2, sort_keys=True)
         fd.write('\n')
+    return data[0]
 
 
-def write_xml(filepath, feature_data, sourcefile='', fullpath=False, hashes=False, mode='xb'):
+def write_jsonl(filepath, feature_data, sourcefile='', fullpath=False,
+                hashes=False, meta={}):
+    """Given a dictionary of `feature_data`, append it as one line
+    of JSON to `filepath`. The line is written with a single write
+    to a file opened in append mode, hence several processes
+    can append to the same file concurrently.
+
+    :param filepath:        filepath at filesystem
+    :type filepath:         str
+    :param feature_data:    associations of feature name to value
+    :type feature_data:     dict
+    :param sourcefile:      filepath to source file
+    :type sourcefile:       str
+    :param fullpath:        shall I store the full path in JSON?
+    :type fullpath:         bool
+    :param hashes:          shall I compute hashes for this file?
+    :type hashes:           bool
+    :param meta:            meta attributes to overwrite metadata
+    :type meta:             dict
+    :return:                metadata and features written
+    :rtype:                 dict
+    """
+    data = extend_metadata(feature_data, sourcefile, fullpath, hashes)
+    data[0].update(meta)
+
+    line = (json.dumps(data[0], sort_keys=True, separators=(',', ':')) + '\n').encode('utf-8')
+    fd = os.open(filepath, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+    try:
+        written = os.write(fd, line)
+        while written < len(line):
+            written += os.write(fd, line[written:])
+    finally:
+        os.close(fd)
+    return data[0]
+
+
+# metadata attributes with structured values stored as JSON in XML attributes
+JSON_META = ('@timing', '@skipped_features')
+
+
+def _xml_meta(name, value):
+    return json.dumps(value, sort_keys=True) if name in JSON_META else str(value)
+
+
+class XMLWriter:
+    """Write metadata and features of many CNF files
+    as ``<file>`` elements of one XML document.
+
+    :param filepath:        filepath at filesystem
+    :type filepath:         str
+    :param mode:            file mode to use for writing
+    :type mode:             str
+    """
+
+    def __init__(self, filepath, mode='xb'):
+        self.fd = open(filepath, mode)
+        self.fd.write(b'<?xml version="1.0" encoding="utf-8"?>\n<features>')
+
+    def write(self, record):
+        """Write `record`, a dictionary of metadata and features
+        as returned by :func:`extend_metadata`"""
+        quote = xml.sax.saxutils.quoteattr
+        meta = ''.join(' {}={}'.format(k[1:], quote(_xml_meta(k, v)))
+                       for k, v in record.items() if k != 'featuring')
+        lines = ['\n  <file{}>'.format(meta)]
+        lines.extend('\n    <featuring {}={}/>'.format(name, quote(str(value)))
+                     for name, value in record['featuring'].items())
+        lines.append('\n  </file>')
+        self.fd.write(''.join(lines).encode('utf-8'))
+
+    def close(self):
+        self.fd.write(b'\n</features>\n')
+        self.fd.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_xml(filepath, feature_data, sourcefile='', fullpath=False,
+              hashes=False, mode='xb', meta={}):
     """Given a dictionary of `feature_data`, store it at `filepath`
     in XML format.
 
@@ -171,31 +385,221 @@ def write_xml(filepath, feature_data, sourcefile='', fullpath=False, hashes=Fals
     :type hashes:           bool
     :param mode:            file mode to use for writing
     :type mode:             str
+    :param meta:            meta attributes to overwrite metadata
+    :type meta:             dict
+    :return:                metadata and features written
+    :rtype:                 dict
     """
     data = extend_metadata(feature_data, sourcefile, fullpath, hashes)
+    data[0].update(meta)
+
+    with XMLWriter(filepath, mode) as writer:
+        writer.write(data[0])
+    return data[0]
+
+
+META_COLUMNS = ('@filename', '@timestamp', '@version', '@md5sum', '@sha1sum', '@cnfhash',
+                '@tags')
+
+
+def corpus_columns():
+    """Return the names and types of all columns of a corpus table.
+    Metadata columns are followed by all features of
+    :data:`cnfanalysis.collect.FEATURE_GROUPS` in group order.
+
+    :return:            pairs of column name and type (str, bool, int or float)
+    :rtype:             [(str, type)]
+    """
+    columns = [(name, str) for name in META_COLUMNS]
+    for group in collect.GROUPS:
+        columns.extend((name, collect.feature_type(name))
+                       for name in collect.FEATURE_GROUPS[group])
+    return columns
+
+
+def corpus_format(filepath):
+    """Determine the format of a corpus table by its file extension"""
+    ext = os.path.splitext(filepath)[1].lower()
+    if ext not in ('.csv', '.parquet'):
+        raise ValueError('Unknown corpus format "{}", expected .csv or .parquet'.format(ext))
+    return ext[1:]
+
+
+class CorpusWriter:
+    """Write features of many CNF files as rows of one table at `filepath`.
+    The columns are given by :func:`corpus_columns` independent of the
+    features computed, missing values are empty. The format is
+    determined by the file extension: CSV (``.csv``) rows are written
+    immediately. Parquet (``.parquet``, requires the `pyarrow` package)
+    rows are written as a row group of `batch_size` rows each.
+
+    :param filepath:    filepath of the table to create
+    :type filepath:     str
+    :param batch_size:  number of rows per Parquet row group
+    :type batch_size:   int
+    """
+
+    def __init__(self, filepath, batch_size=1024):
+        self.filepath = filepath
+        self.format = corpus_format(filepath)
+        self.columns = corpus_columns()
+        self.batch_size = batch_size
+        self.rows = []
+        if self.format == 'parquet':
+            import pyarrow
+            import pyarrow.parquet
+
+            types = {str: pyarrow.string(), bool: pyarrow.bool_(),
+                     int: pyarrow.int64(), float: pyarrow.float64()}
+            self.schema = pyarrow.schema([(n, types[t]) for n, t in self.columns])
+            self.writer = pyarrow.parquet.ParquetWriter(filepath, self.schema)
+        else:
+            self.fd = open(filepath, 'x', encoding='utf-8', newline='')
+            self.writer = csv.writer(self.fd)
+            self.writer.writerow([name for name, typ in self.columns])
+
+    def write(self, record):
+        """Append a row for `record`, a dictionary of metadata
+        and features as returned by :func:`extend_metadata`"""
+        row = [record.get(name) for name in META_COLUMNS]
+        featuring = record.get('featuring', {})
+        row.extend(featuring.get(name) for name, typ in self.columns[len(META_COLUMNS):])
+        self.write_row(row)
+
+    def write_row(self, row):
+        """Append a row given as list of values in column order"""
+        if self.format == 'parquet':
+            self.rows.append(row)
+            if len(self.rows) >= self.batch_size:
+                self.flush()
+        else:
+            self.writer.writerow(['' if v is None else str(v).lower() if isinstance(v, bool)
+                                  else v for v in row])
+            self.fd.flush()
+
+    def flush(self):
+        """Write buffered rows"""
+        if self.format == 'parquet' and self.rows:
+            import pyarrow
+
+            batch = dict((name, list(values)) for (name, typ), values
+                         in zip(self.columns, zip(*self.rows)))
+            self.writer.write_table(pyarrow.Table.from_pydict(batch, schema=self.schema))
+            self.rows = []
+
+    def close(self):
+        self.flush()
+        if self.format == 'parquet':
+            self.writer.close()
+        else:
+            self.fd.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _replace(filepath, write):
+    """Call `write` with a temporary filepath next to `filepath`
+    and replace `filepath` by the file written"""
+    dirname, basename = os.path.split(filepath)
+    tmppath = os.path.join(dirname, '.tmp-' + basename)
+    try:
+        write(tmppath)
+        os.replace(tmppath, filepath)
+    finally:
+        if os.path.exists(tmppath):
+            os.remove(tmppath)
+
 
-    with open(filepath, mode) as fd:
-        doc = xml.sax.saxutils.XMLGenerator(fd, encoding='utf-8',
-                                            short_empty_elements=True)
-        doc.startDocument()
-        doc.startElement('features', {})
-        doc.ignorableWhitespace("\n  ")
+def write_corpus(filepath, table):
+    """Replace the corpus table at `filepath` by the rows of `table`.
+
+    :param filepath:    filepath of a .csv or .parquet table
+    :type filepath:     str
+    :param table:       column names associated with lists of values
+                        like returned by :func:`read_corpus`
+    :type table:        {str: list}
+    """
+    def write(tmppath):
+        with CorpusWriter(tmppath) as writer:
+            rows = len(next(iter(table.values()), []))
+            columns = [table.get(name, [None] * rows) for name, typ in writer.columns]
+            for row in zip(*columns):
+                writer.write_row(row)
+
+    _replace(filepath, write)
 
-        meta = dict((k[1:], v) for k, v in data[0].items() if k != 'featuring')
-        doc.startElement('file', meta)
 
-        for name, value in data[0]['featuring'].items():
-            doc.ignorableWhitespace("\n    ")
-            doc.startElement('featuring', {name: str(value)})
-            doc.endElement('featuring')
+def write_records(filepath, records, fmt=None):
+    """Replace the featuresfile at `filepath` by `records`
+    as returned by :func:`read`.
 
-        doc.ignorableWhitespace("\n  ")
-        doc.endElement('file')
-        doc.ignorableWhitespace("\n")
+    :param filepath:    filepath to featuresfile
+    :type filepath:     str
+    :param records:     dictionaries containing metadata and features
+    :type records:      [dict]
+    :param fmt:         format: 'xml', 'json', 'jsonl' or None (= detect)
+    :type fmt:          str
+    """
+    if fmt is None:
+        fmt = detect_format(filepath) or 'json'
 
-        doc.endElement('features')
-        doc.ignorableWhitespace("\n")
-        doc.endDocument()
+    def write(tmppath):
+        if fmt == 'xml':
+            with XMLWriter(tmppath) as writer:
+                for record in records:
+                    writer.write(record)
+            return
+        with open(tmppath, 'x', encoding='utf-8') as fd:
+            if fmt == 'jsonl':
+                for record in records:
+                    fd.write(json.dumps(record, sort_keys=True, separators=(',', ':')) + '\n')
+            else:
+                json.dump(records, fd, indent=2, sort_keys=True)
+                fd.write('\n')
+
+    _replace(filepath, write)
+
+
+def read_corpus(filepath):
+    """Read a corpus table written by :class:`CorpusWriter`.
+
+    :param filepath:    filepath of a .csv or .parquet table
+    :type filepath:     str
+    :return:            column names associated with lists of values,
+                        None for missing values
+    :rtype:             {str: list}
+    """
+    if corpus_format(filepath) == 'parquet':
+        import pyarrow.parquet
+
+        table = pyarrow.parquet.read_table(filepath).to_pydict()
+        rows = len(next(iter(table.values()), []))
+        for name in META_COLUMNS:
+            # tables written by previous versions lack some metadata columns
+            table.setdefault(name, [None] * rows)
+        return table
+
+    def parse(values, typ):
+        convert = 'true'.__eq__ if typ is bool else typ
+        if '' not in values:
+            return list(map(convert, values))
+        return [None if v == '' else convert(v) for v in values]
+
+    types = dict(corpus_columns())
+    with open(filepath, encoding='utf-8', newline='') as fd:
+        reader = csv.reader(fd)
+        names = next(reader)
+        columns = list(zip(*reader)) or [()] * len(names)
+    table = dict((name, parse(values, types.get(name, str)))
+                 for name, values in zip(names, columns))
+    rows = len(columns[0]) if columns else 0
+    for name in META_COLUMNS:
+        table.setdefault(name, [None] * rows)
+    return table
 
 
 def read(filepath, fmt=None):
@@ -204,7 +608,7 @@ def read(filepath, fmt=None):
 
     :param filepath:    filepath to source file
     :type filepath:     str
-    :param fmt:         format: 'xml', 'json' or None (= unknown)
+    :param fmt:         format: 'xml', 'json', 'jsonl' or None (= unknown)
     :type fmt:          str
     :return:            a list of dictionaries containing metadata and features,
                         might also be a generator
@@ -217,6 +621,8 @@ def read(filepath, fmt=None):
 
     if fmt == 'json':
         return read_json(filepath)
+    elif fmt == 'jsonl':
+        return read_jsonl(filepath)
     else:
         return read_xml(filepath)
 
@@ -233,26 +639,93 @@ def read_json(filepath):
         return json.load(fd)
 
 
-def read_xml(filepath):
-    """Read a ``featuresfile`` in XML format from given `filepath`.
+def read_jsonl(filepath):
+    """Read a ``featuresfile`` in JSON Lines format from given `filepath`.
+    A last line not terminated yet (because it is still written)
+    is skipped.
 
     :param filepath:    filepath to source file
     :type str:          str
     :return:            a generator of dictionaries containing metadata and features
     :rtype:             generator of dicts
     """
-    try:
-        for (event, elem) in xml.etree.ElementTree.iterparse(filepath, events=['start', 'end']):
-            if event == 'start' and elem.tag == 'features':
-                features = {}
-            elif event == 'start' and elem.tag == 'file':
-                for attr, val in elem.attrib.items():
-                    features['@' + attr] = val
-            elif event == 'start' and elem.tag == 'featuring':
-                for attr, val in elem.attrib.items():
-                    features[attr] = val
-            elif event == 'end' and elem.tag == 'file':
-                yield features
-                features = {}
-    except Exception:
-        raise ValueError("Invalid features file XML structure in {}".format(filepath))
+    with open(filepath, encoding='utf-8') as fd:
+        for lineno, line in enumerate(fd):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                if line.endswith('\n'):
+                    errmsg = "Invalid JSON in line {} of features file {}"
+                    raise ValueError(errmsg.format(lineno + 1, filepath))
+
+
+def _xml_number(value):
+    """Parse a float feature written as string, integral values
+    stay integers like in JSON featuresfiles"""
+    if '.' in value or 'e' in value or 'n' in value:
+        return float(value)
+    return int(value)
+
+
+def _xml_converters():
+    """Functions converting attribute strings to feature values by type"""
+    parse = {bool: lambda v: v.lower() == 'true', int: int, float: _xml_number}
+    return dict((name, parse[collect.feature_type(name)])
+                for names in collect.FEATURE_GROUPS.values() for name in names)
+
+
+def read_xml(filepath, blocksize=1 << 16):
+    """Read a ``featuresfile`` in XML format from given `filepath`.
+    The document is parsed blockwise by an expat parser without
+    building an element tree, records are yielded as soon as their
+    ``<file>`` element is complete. Feature values are converted to
+    bool, int or float according to :func:`cnfanalysis.collect.feature_type`.
+
+    :param filepath:    filepath to source file
+    :type str:          str
+    :param blocksize:   number of bytes to parse at once
+    :type blocksize:    int
+    :return:            a generator of dictionaries containing metadata and
+                        features like :func:`read_json`
+    :rtype:             generator of dicts
+    """
+    converters = _xml_converters()
+    records = []
+
+    def start(tag, attrs):
+        if tag == 'featuring':
+            records[-1]['featuring'].update(attrs)
+        elif tag == 'file':
+            record = dict(('@' + attr, val) for attr, val in attrs.items())
+            for name in JSON_META:
+                if name in record:
+                    record[name] = json.loads(record[name])
+            record['featuring'] = {}
+            records.append(record)
+
+    def typed(record):
+        features = record['featuring']
+        for name, value in features.items():
+            if name in converters:
+                features[name] = converters[name](value)
+        return record
+
+    parser = xml.parsers.expat.ParserCreate()
+    parser.StartElementHandler = start
+    with open(filepath, 'rb') as fd:
+        while True:
+            block = fd.read(blocksize)
+            try:
+                parser.Parse(block, not block)
+            except (IndexError, ValueError, xml.parsers.expat.ExpatError):
+                raise ValueError("Invalid features file XML structure in {}".format(filepath))
+            if not block:
+                break
+            # the last <file> element might continue in the next block
+            for record in records[:-1]:
+                yield typed(record)
+            del records[:-1]
+    for record in records:
+        yield typed(record)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+"""
+    cnfanalysis.streaming
+    ---------------------
+
+    Single-pass statistics with memory independent of the number
+    of values. Results equal the ones of the `statistics` module
+    applied to the list of all values.
+
+    (C) 2015-2016, CC-0, Lukas Prokop
+"""
+
+import math
+import statistics
+import fractions
+
+
+def sqrt_frac(n, m):
+    """Correctly rounded square root of the non-negative fraction n/m"""
+    q = (n.bit_length() - m.bit_length() - 109) // 2
+    if q >= 0:
+        m <<= 2 * q
+        a = math.isqrt(n // m)
+        return ((a | (a * a * m != n)) << q) / 1
+    n <<= -2 * q
+    a = math.isqrt(n // m)
+    return (a | (a * a * m != n)) / (1 << -q)
+
+
+def _convert(value, integral):
+    """Convert exact fraction `value` like `statistics` does:
+    to int if all data was integral and the result is integral,
+    otherwise to float.
+    """
+    if integral and value.denominator == 1:
+        return int(value)
+    return float(value)
+
+
+def describe(hist, prefix, spec='aimsd'):
+    """Compute general statistics for numbers given as histogram.
+    Equivalent to :meth:`cnfanalysis.collect.State._stat` applied to
+    a list containing every value of `hist` as often as it is counted.
+    The entropy is summed up exactly.
+
+    :param hist:        a mapping of numbers to their number of occurences
+    :type hist:         {int: int} or {float: int}
+    :param prefix:      string prefix to append to dict keys returned
+    :type prefix:       str
+    :param spec:        features to compute, a=max, i=min, m=mean,
+                        s=stdev, d=median, e=entropy
+    :type spec:         str
+    :return:            dictionary of features computed
+    :rtype:             dict
+    """
+    values = sorted(v for v, count in hist.items() if count)
+    if not values:
+        return {}
+    n = sum(hist[v] for v in values)
+    integral = all(isinstance(v, int) for v in values)
+
+    d = {}
+    if 'a' in spec:
+        d[prefix + '_largest'] = values[-1]
+    if 'i' in spec:
+        d[prefix + '_smallest'] = values[0]
+    if 'm' in spec or 's' in spec:
+        sx = sum(fractions.Fraction(v) * hist[v] for v in values)
+    if 'm' in spec:
+        d[prefix + '_mean'] = _convert(sx / n, integral)
+    if 's' in spec:
+        sxx = sum(fractions.Fraction(v) ** 2 * hist[v] for v in values)
+        mss = (n * sxx - sx * sx) / (n * n)
+        d[prefix + '_sd'] = sqrt_frac(mss.numerator, mss.denominator)
+    if 'd' in spec:
+        d[prefix + '_median'] = _median(hist, values, n)
+    if 'e' in spec:
+        d[prefix + '_entropy'] = -entropy_sum(hist)
+    return d
+
+
+def _median(hist, values, n):
+    """Median of the values in `hist` like `statistics.median`"""
+    def nth(rank):
+        for v in values:
+            rank -= hist[v]
+            if rank < 0:
+                return v
+
+    if n % 2 == 1:
+        return nth(n // 2)
+    return (nth(n // 2 - 1) + nth(n // 2)) / 2
+
+
+def entropy_sum(hist):
+    """Exact sum of ``val * log2(val)`` over all positive values
+    of histogram `hist`, rounded to float once.
+    """
+    total = sum(fractions.Fraction(val * math.log(val, 2)) * count
+                for val, count in hist.items() if val > 0.0)
+    return float(total)
+
+
+def pstdev(hist):
+    """Population standard deviation of the values in `hist`"""
+    d = describe(hist, '', 's')
+    if not d:
+        raise statistics.StatisticsError('pstdev requires at least one data point')
+    return d['_sd']
+
+
+def mean(hist):
+    """Arithmetic mean of the values in `hist`"""
+    d = describe(hist, '', 'm')
+    if not d:
+        raise statistics.StatisticsError('mean requires at least one data point')
+    return d['_mean']
+
+
+class ExactMean:
+    """Mean of a stream of floats, computed exactly like `statistics.mean`.
+    Every finite float is an integer multiple of 2**-1074, hence the sum
+    is kept as integer in that unit.
+    """
+
+    SCALE = 1074
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+
+    def add(self, value):
+        """Add a float to the stream"""
+        n, d = value.as_integer_ratio()
+        self.total += n << (self.SCALE + 1 - d.bit_length())
+        self.count += 1
+
+    def update(self, values):
+        """Add all floats of `values` to the stream"""
+        for value in values:
+            self.add(value)
+
+    def merge(self, other):
+        """Add all values of another ExactMean to this one"""
+        self.total += other.total
+        self.count += other.count
+
+    def mean(self):
+        """Return the mean of all values added"""
+        if self.count < 1:
+            raise statistics.StatisticsError('mean requires at least one data point')
+        return float(fractions.Fraction(self.total, self.count << self.SCALE))
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+"""
+    cnfanalysis.unionfind
+    ---------------------
+
+    Union-Find (disjoint sets) data structure stored in flat arrays.
+
+    (C) 2015-2016, CC-0, Lukas Prokop
+"""
+
+import array
+
+from . import diskarray
+
+
+class UnionFind:
+    """Disjoint sets over the integers 0, ..., n-1.
+    Uses union by size and path halving. Parents and sizes
+    are stored in `array.array` objects of 4 bytes per element
+    (8 bytes if `n` exceeds the 32-bit range). If `disk` is true,
+    both are stored in temporary files mapped into memory instead
+    (see :mod:`cnfanalysis.diskarray`).
+    """
+
+    # number of elements initialized at once in temporary files
+    CHUNK_SIZE = 1 << 20
+
+    def __init__(self, n, disk=False):
+        typecode = 'i' if n < 2 ** 31 else 'q'
+        if disk:
+            self.parent = diskarray.zeros(typecode, n)
+            self.size = diskarray.zeros(typecode, n)
+            for start in range(0, n, self.CHUNK_SIZE):
+                end = min(start + self.CHUNK_SIZE, n)
+                self.parent[start:end] = array.array(typecode, range(start, end))
+                self.size[start:end] = array.array(typecode, [1]) * (end - start)
+        else:
+            self.parent = array.array(typecode, range(n))
+            self.size = array.array(typecode, [1]) * n
+        self.components = n
+
+    def __len__(self):
+        return len(self.parent)
+
+    def count(self):
+        """Return the number of disjoint sets"""
+        return self.components
+
+    def find(self, p):
+        """Return the representative of the set containing `p`"""
+        parent = self.parent
+        while parent[p] != p:
+            parent[p] = parent[parent[p]]
+            p = parent[p]
+        return p
+
+    def connected(self, p, q):
+        """Are `p` and `q` in the same set?"""
+        return self.find(p) == self.find(q)
+
+    def union(self, p, q):
+        """Merge the sets containing `p` and `q`.
+
+        :return:    False if both were already in the same set
+        :rtype:     bool
+        """
+        p, q = self.find(p), self.find(q)
+        if p == q:
+            return False
+        if self.size[p] < self.size[q]:
+            p, q = q, p
+        self.parent[q] = p
+        self.size[p] += self.size[q]
+        self.components -= 1
+        return True
+
+    def union_many(self, items):
+        """Merge the sets of all elements of `items` into one set"""
+        parent, size = self.parent, self.size
+        items = iter(items)
+        for root in items:
+            break
+        else:
+            return
+        while parent[root] != root:
+            parent[root] = parent[parent[root]]
+            root = parent[root]
+
+        for q in items:
+            while parent[q] != q:
+                parent[q] = parent[parent[q]]
+                q = parent[q]
+            if q == root:
+                continue
+            if size[root] < size[q]:
+                root, q = q, root
+            parent[q] = root
+            size[root] += size[q]
+            self.components -= 1
+
+    def union_pairs(self, ps, qs):
+        """Merge the sets of ``ps[i]`` and ``qs[i]`` for every index ``i``.
+        Consecutive equal elements in `ps` are resolved only once, hence
+        pairs are best grouped by `ps`.
+        """
+        parent, size = self.parent, self.size
+        prev = root = None
+        for p, q in zip(ps, qs):
+            if p != prev:
+                prev = root = p
+                while parent[root] != root:
+                    parent[root] = parent[parent[root]]
+                    root = parent[root]
+            while parent[q] != q:
+                parent[q] = parent[parent[q]]
+                q = parent[q]
+            if q == root:
+                continue
+            if size[root] < size[q]:
+                root, q = q, root
+            parent[q] = root
+            size[root] += size[q]
+            self.components -= 1
+
+    def merge(self, other):
+        """Merge all sets of another UnionFind over the same elements
+        into this one. Afterwards two elements are in the same set
+        if they were in the same set in either structure.
+        """
+        if len(other) != len(self):
+            errmsg = 'Cannot merge UnionFind of {} elements into one of {} elements'
+            raise ValueError(errmsg.format(len(other), len(self)))
+        moved = [i for i, p in enumerate(other.parent) if i != p]
+        self.union_pairs(moved, map(other.parent.__getitem__, moved))
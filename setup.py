@@ -34,6 +34,7 @@ setup(
     description='CNF file analysis',
     long_description=readfile('README.rst'),
     packages=['cnfanalysis'],
+    python_requires='>=3.8',
     platforms='any',
     classifiers=[
         'Development Status :: 5 - Production/Stable',
@@ -51,7 +52,9 @@ setup(
     entry_points={
         "console_scripts": [
             'cnf-analysis-py = cnfanalysis.scripts:main',
-            'cnf-analysis-annotate = cnfanalysis.scripts:annotate'
+            'cnf-analysis-annotate = cnfanalysis.scripts:annotate',
+            'cnf-analysis-cache = cnfanalysis.scripts:cache_command',
+            'cnf-analysis-query = cnfanalysis.scripts:query'
         ]
     }
 )
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+"""
+    tests.test_batch
+    ----------------
+
+    In-memory analysis by :func:`cnfanalysis.batch.analyze`
+    and :func:`cnfanalysis.batch.analyze_many`.
+
+    (C) 2015-2016, CC-0, Lukas Prokop
+"""
+
+import array
+import numbers
+import unittest
+
+from cnfanalysis import batch
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+CLAUSES = [[1, -2], [2, 3, -1], [-3]]
+FLAT = [1, -2, 0, 2, 3, -1, 0, -3, 0]
+
+
+class Literal:
+    """Integral literal which is no int, like a NumPy integer"""
+
+    def __init__(self, value):
+        self.value = value
+
+    def __index__(self):
+        return self.value
+
+    def __eq__(self, other):
+        return self.value == other
+
+    def __bool__(self):
+        return bool(self.value)
+
+
+numbers.Integral.register(Literal)
+
+
+class TestAnalyze(unittest.TestCase):
+
+    def setUp(self):
+        self.expected = batch.analyze(CLAUSES)
+
+    def test_formulas(self):
+        self.assertEqual(self.expected['clauses_count'], 3)
+        self.assertEqual(batch.analyze([tuple(c) for c in CLAUSES]), self.expected)
+        self.assertEqual(batch.analyze(FLAT), self.expected)
+        self.assertEqual(batch.analyze(FLAT[:-1]), self.expected)
+        self.assertEqual(batch.analyze(array.array('i', FLAT)), self.expected)
+        self.assertEqual(batch.analyze([1, -2, 2, 3, -1, -3], offsets=[0, 2, 5, 6]),
+                         self.expected)
+
+    def test_integral_literals(self):
+        self.assertEqual(batch.analyze(list(map(Literal, FLAT))), self.expected)
+
+    @unittest.skipIf(numpy is None, 'NumPy is not installed')
+    def test_numpy(self):
+        for dtype in (numpy.int32, numpy.int64):
+            with self.subTest(dtype=dtype):
+                self.assertEqual(batch.analyze(numpy.array(FLAT, dtype=dtype)), self.expected)
+
+    def test_nbvars(self):
+        self.assertEqual(batch.analyze(CLAUSES, nbvars=5)['nbvars'], 5)
+
+
+class TestAnalyzeMany(unittest.TestCase):
+
+    def test_tuples_of_clauses(self):
+        formulas = [tuple(map(tuple, CLAUSES)), ((1,),)]
+        counts = [f['clauses_count'] for f in batch.analyze_many(formulas)]
+        self.assertEqual(counts, [3, 1])
+
+    def test_kwargs(self):
+        formulas = [CLAUSES, [1, -2, 2, 3, -1, -3]]
+        kwargs = [{'nbvars': 4}, {'offsets': [0, 2, 5, 6]}]
+        results = list(batch.analyze_many(formulas, kwargs=kwargs))
+        self.assertEqual(results[0], batch.analyze(CLAUSES, nbvars=4))
+        self.assertEqual(results[1], batch.analyze(CLAUSES))
+
+    def test_processes(self):
+        formulas = [CLAUSES, FLAT, [[1]]] * 3
+        self.assertEqual(list(batch.analyze_many(formulas, processes=2, chunksize=2)),
+                         list(batch.analyze_many(formulas)))
+
+
+if __name__ == '__main__':
+    unittest.main()
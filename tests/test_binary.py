@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+"""
+    tests.test_binary
+    -----------------
+
+    Binary sidecars of :mod:`cnfanalysis.binary` and their use
+    by :func:`cnfanalysis.scripts.evaluate_file`.
+
+    (C) 2015-2016, CC-0, Lukas Prokop
+"""
+
+import io
+import os
+import gzip
+import tempfile
+import unittest
+import contextlib
+from unittest import mock
+
+from cnfanalysis import dimacs, binary, stats, scripts
+
+from test_engines import random_cnf
+
+
+def quiet(fn, *args, **kwargs):
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), \
+            contextlib.redirect_stderr(devnull):
+        return fn(*args, **kwargs)
+
+
+class TestSidecar(unittest.TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.filepath = os.path.join(tmpdir.name, 'f.cnf')
+        self.content = random_cnf(2, nbclauses=200)
+        with open(self.filepath, 'wb') as fd:
+            fd.write(self.content)
+        self.sidecar = binary.sidecar_path(self.filepath)
+
+    def evaluate(self, filepath=None, **kwargs):
+        record = quiet(scripts.evaluate_file, filepath or self.filepath, None, **kwargs)
+        record.pop('@timestamp')
+        return record
+
+    def test_round_trip(self):
+        self.assertEqual(binary.convert(self.filepath), self.sidecar)
+        expected = dimacs.CNF.from_reader(dimacs.read_bulk(io.BytesIO(self.content)))
+        cnf, header = binary.load(self.sidecar)
+        self.assertEqual((cnf.nbvars, cnf.nbclauses), (expected.nbvars, expected.nbclauses))
+        self.assertEqual(list(cnf.literals), list(expected.literals))
+        self.assertEqual(list(cnf.offsets), list(expected.offsets))
+
+        md5sum, sha1sum, cnf_hash = stats.file_hashes(self.filepath)
+        self.assertEqual(binary.read_header(self.sidecar)['clauses'], 200)
+        self.assertEqual((header['md5sum'], header['sha1sum'], header['cnfhash']),
+                         (md5sum, sha1sum, cnf_hash))
+
+    def test_stale(self):
+        binary.convert(self.filepath)
+        self.assertIsNotNone(binary.load_fresh(self.sidecar, self.filepath))
+        self.assertIsNone(binary.load_fresh(self.sidecar, self.filepath, ignore_lines='c'))
+        with open(self.filepath, 'ab') as fd:
+            fd.write(b'c appended\n')
+        self.assertIsNone(binary.load_fresh(self.sidecar, self.filepath))
+
+    def test_evaluate(self):
+        expected = {engine: self.evaluate(engine=engine) for engine in ('stream', 'vectorized')}
+        quiet(scripts.convert_file, self.filepath)
+        # the DIMACS file is hashed, but not parsed
+        with mock.patch.object(dimacs, 'read_bulk', side_effect=AssertionError('parsed')):
+            for engine in ('stream', 'vectorized'):
+                with self.subTest(engine=engine):
+                    self.assertEqual(self.evaluate(engine=engine), expected[engine])
+
+    def test_compressed(self):
+        gzpath = self.filepath + '.gz'
+        with gzip.open(gzpath, 'wb') as fd:
+            fd.write(self.content)
+        expected = self.evaluate(gzpath)
+        quiet(scripts.convert_file, gzpath)
+        self.assertTrue(os.path.exists(binary.sidecar_path(gzpath)))
+        self.assertEqual(self.evaluate(gzpath), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
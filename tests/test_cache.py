@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+"""
+    tests.test_cache
+    ----------------
+
+    Feature cache :class:`cnfanalysis.cache.FeatureCache` and its use
+    by :func:`cnfanalysis.scripts.evaluate_file`.
+
+    (C) 2015-2016, CC-0, Lukas Prokop
+"""
+
+import os
+import tempfile
+import unittest
+import contextlib
+
+from cnfanalysis import cache, scripts
+
+
+CONTENT = b'c example\np cnf 3 3\n1 -2 0\n2 3 0\n-1 0\n'
+SHA1 = '0' * 40
+META = {'@md5sum': '1' * 32, '@sha1sum': SHA1, '@cnfhash': 'cnf2$' + '2' * 40}
+
+
+def quiet(fn, *args, **kwargs):
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), \
+            contextlib.redirect_stderr(devnull):
+        return fn(*args, **kwargs)
+
+
+class TestFeatureCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.db = cache.FeatureCache(os.path.join(self.tmpdir.name, 'c.sqlite'))
+        self.addCleanup(self.db.close)
+
+    def test_miss(self):
+        self.assertIsNone(self.db.get(SHA1, {'linear'}))
+
+    def test_hit(self):
+        self.db.put(SHA1, {'linear'}, {'clauses_count': 3}, META)
+        features, meta = self.db.get(SHA1, {'linear'}, hashes=True)
+        self.assertEqual(features, {'clauses_count': 3})
+        self.assertEqual(meta, META)
+
+    def test_missing_groups(self):
+        self.db.put(SHA1, {'linear'}, {'clauses_count': 3})
+        self.assertIsNone(self.db.get(SHA1, {'linear', 'frequency'}))
+        self.db.put(SHA1, {'frequency'}, {'variables_largest': 3})
+        features, meta = self.db.get(SHA1, {'linear', 'frequency'})
+        self.assertEqual(features, {'clauses_count': 3, 'variables_largest': 3})
+
+    def test_missing_hashes(self):
+        self.db.put(SHA1, {'linear'}, {'clauses_count': 3})
+        self.assertIsNone(self.db.get(SHA1, {'linear'}, hashes=True))
+        self.assertIsNotNone(self.db.get(SHA1, {'linear'}, hashes=False))
+
+    def test_eviction(self):
+        for i in range(4):
+            self.db.put('{:040x}'.format(i), {'linear'}, {'clauses_count': i})
+        count, size = self.db.size()
+        self.assertEqual(count, 4)
+        # the least recently used entries are evicted first
+        self.db.get('{:040x}'.format(0), {'linear'})
+        self.assertEqual(self.db.prune(size // 2), 2)
+        self.assertIsNotNone(self.db.get('{:040x}'.format(0), {'linear'}))
+        self.assertIsNone(self.db.get('{:040x}'.format(1), {'linear'}))
+        self.assertIsNone(self.db.get('{:040x}'.format(2), {'linear'}))
+        self.assertIsNotNone(self.db.get('{:040x}'.format(3), {'linear'}))
+
+    def test_cacheable(self):
+        self.assertTrue(cache.cacheable('c%'))
+        self.assertTrue(cache.cacheable('%c'))
+        self.assertFalse(cache.cacheable('c'))
+
+
+class TestEvaluateCached(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.filepath = os.path.join(self.tmpdir.name, 'f.cnf')
+        with open(self.filepath, 'wb') as fd:
+            fd.write(CONTENT)
+        self.cache_path = os.path.join(self.tmpdir.name, 'c.sqlite')
+
+    def evaluate(self, ignore_lines='c%'):
+        record = quiet(scripts.evaluate_file, self.filepath, None, ignore_lines=ignore_lines,
+                       cache_path=self.cache_path)
+        record.pop('@timestamp', None)
+        return record
+
+    def entries(self):
+        with cache.FeatureCache(self.cache_path) as db:
+            return db.size()[0]
+
+    def test_hit_equals_miss(self):
+        computed = self.evaluate()
+        self.assertEqual(self.entries(), 1)
+        self.assertEqual(self.evaluate(), computed)
+
+    def test_other_ignore_lines(self):
+        self.evaluate(ignore_lines='c')
+        self.assertFalse(os.path.exists(self.cache_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
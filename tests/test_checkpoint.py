@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+"""
+    tests.test_checkpoint
+    ---------------------
+
+    Checkpoints of :mod:`cnfanalysis.checkpoint` resuming
+    an interrupted analysis.
+
+    (C) 2015-2016, CC-0, Lukas Prokop
+"""
+
+import os
+import tempfile
+import unittest
+
+from cnfanalysis import dimacs, collect, checkpoint
+
+from test_engines import random_cnf, stream_features
+
+
+CHUNK_SIZE = 256
+
+
+class Interrupt(Exception):
+    pass
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.filepath = os.path.join(tmpdir.name, 'f.cnf')
+        self.content = random_cnf(3, nbclauses=400)
+        with open(self.filepath, 'wb') as fd:
+            fd.write(self.content)
+        self.path = checkpoint.checkpoint_path(self.filepath)
+
+    def checkpoint(self):
+        return checkpoint.Checkpoint(self.path, self.filepath, clauses=50)
+
+    def run_until(self, clauses=None, groups=collect.GROUPS):
+        """Analyze the CNF like :func:`cnfanalysis.scripts.evaluate`
+        resuming from the checkpoint. Interrupt after `clauses` clauses."""
+        ckpt = self.checkpoint()
+        state = ckpt.resume(groups)
+        header_fns, clause_fns, literal_fns = collect.collectors(groups)
+        header = None
+        if state is not None:
+            header, header_fns = (state.nbvars, state.nbclauses), []
+        else:
+            state = collect.State(groups)
+        if clauses is not None:
+            seen = [0]
+
+            def interrupt(state, clause):
+                seen[0] += 1
+                if seen[0] > clauses:
+                    raise Interrupt()
+            clause_fns = clause_fns + [interrupt]
+
+        with open(self.filepath, 'rb') as fd:
+            reader = dimacs.read_bulk(ckpt.reader(fd), chunk_size=CHUNK_SIZE, header=header)
+            collect.dispatch_bulk(ckpt.iterate(reader, state), state,
+                                  header_fns, clause_fns, literal_fns)
+        ckpt.remove()
+        return state.finalize()
+
+    def test_resume(self):
+        with self.assertRaises(Interrupt):
+            self.run_until(150)
+        self.assertTrue(os.path.exists(self.path))
+        self.assertIsNotNone(self.checkpoint().resume(collect.GROUPS))
+        with self.assertRaises(Interrupt):
+            self.run_until(150)
+        self.assertEqual(self.run_until(), stream_features(self.content))
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_resume_offset(self):
+        with self.assertRaises(Interrupt):
+            self.run_until(150)
+        ckpt = self.checkpoint()
+        state = ckpt.resume(collect.GROUPS)
+        self.assertEqual(state.clauses_count, ckpt.clauses)
+        self.assertGreaterEqual(ckpt.clauses, 50)
+        self.assertLessEqual(ckpt.clauses, 150)
+        # the checkpoint offset is the start of a clause line
+        self.assertEqual(self.content[ckpt.offset - 1:ckpt.offset], b'\n')
+
+    def test_stale(self):
+        with self.assertRaises(Interrupt):
+            self.run_until(150)
+        self.assertIsNone(self.checkpoint().resume({'linear'}))
+        with open(self.filepath, 'ab') as fd:
+            fd.write(b'c appended\n')
+        self.assertIsNone(self.checkpoint().resume(collect.GROUPS))
+        # a stale checkpoint is ignored and replaced
+        self.assertEqual(self.run_until(), stream_features(self.content + b'c appended\n'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+"""
+    tests.test_dimacs
+    -----------------
+
+    DIMACS readers :func:`cnfanalysis.dimacs.read` and
+    :func:`cnfanalysis.dimacs.read_bulk`.
+
+    (C) 2015-2016, CC-0, Lukas Prokop
+"""
+
+import io
+import unittest
+
+from cnfanalysis import dimacs
+
+
+CHUNK_SIZES = list(range(1, 48)) + [1 << 20]
+INVALID = [
+    b'p cnf 2 2\nc x\nc y\nc z\n1 0\n2 0\np cnf 1 1\n',
+    b'c x\n%y\n\nc z\n1 2 0\n',
+    b'c x\nc y\np cnf x 1\n1 0\n',
+    b'p cnf 3 3\nc a\n1 0\nc b\nc c\n2 0\n\nc d\n3 0\nc e\np cnf 3 3\n'
+]
+
+
+def read_error(content):
+    try:
+        list(dimacs.read(io.StringIO(content.decode('ascii'))))
+    except ValueError as e:
+        return str(e)
+
+
+def read_bulk_error(content, chunk_size):
+    try:
+        list(dimacs.read_bulk(io.BytesIO(content), chunk_size=chunk_size))
+    except ValueError as e:
+        return str(e)
+
+
+class TestLineNumbers(unittest.TestCase):
+
+    def test_error_messages(self):
+        for content in INVALID:
+            expected = read_error(content)
+            self.assertIn(' at line ', expected)
+            for chunk_size in CHUNK_SIZES:
+                with self.subTest(content=content, chunk_size=chunk_size):
+                    self.assertEqual(expected, read_bulk_error(content, chunk_size))
+
+    def test_comment_lines_are_counted(self):
+        content = b'p cnf 2 2\nc x\nc y\nc z\n1 0\n2 0\np cnf 1 1\n'
+        for chunk_size in (8, 20, 1 << 20):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(read_bulk_error(content, chunk_size),
+                                 'Unexpected DIMACS header at line 7')
+
+
+if __name__ == '__main__':
+    unittest.main()
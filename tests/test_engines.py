@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+
+"""
+    tests.test_engines
+    ------------------
+
+    Features of the stream engine (:class:`cnfanalysis.collect.State`
+    with the dispatch functions) and the vectorized engine
+    (:class:`cnfanalysis.collect.VectorizedState`).
+
+    (C) 2015-2016, CC-0, Lukas Prokop
+"""
+
+import io
+import os
+import random
+import tempfile
+import unittest
+import statistics
+
+from cnfanalysis import dimacs, collect, scripts
+
+
+CHUNK_SIZES = [16, 64, 1 << 20]
+
+
+def stream_features(content, chunk_size=1 << 20, groups=collect.GROUPS):
+    state = collect.State(groups)
+    reader = dimacs.read_bulk(io.BytesIO(content), chunk_size=chunk_size)
+    collect.dispatch_bulk(reader, state, *collect.collectors(groups))
+    return state.finalize()
+
+
+def text_features(content, chunk_size=None, groups=collect.GROUPS):
+    state = collect.State(groups)
+    reader = dimacs.read(io.StringIO(content.decode('ascii')))
+    collect.dispatch(reader, state, *collect.collectors(groups))
+    return state.finalize()
+
+
+def vectorized_features(content, chunk_size=1 << 20, groups=collect.GROUPS):
+    state = collect.VectorizedState(groups)
+    reader = dimacs.read_bulk(io.BytesIO(content), chunk_size=chunk_size)
+    state.consume(dimacs.CNF.from_reader(reader))
+    return state.finalize()
+
+
+def random_cnf(seed, nbvars=12, nbclauses=60, empty=False):
+    """DIMACS content of a random CNF with unit clauses, repeated
+    and complementary literals and, if `empty`, empty clauses"""
+    rand = random.Random(seed)
+    lengths = (0, 1, 1, 2, 2, 3, 3, 5) if empty else (1, 1, 2, 2, 3, 3, 5)
+    lines = ['c seed {}'.format(seed), 'p cnf {} {}'.format(nbvars, nbclauses)]
+    for _ in range(nbclauses):
+        clause = [rand.choice((-1, 1)) * rand.randint(1, nbvars)
+                  for _ in range(rand.choice(lengths))]
+        if clause and rand.random() < 0.2:
+            clause.append(clause[0])
+        if clause and rand.random() < 0.2:
+            clause.append(-rand.choice(clause))
+        lines.append(' '.join(map(str, clause + [0])))
+    return '\n'.join(lines).encode('ascii') + b'\n'
+
+
+ENGINES = [stream_features, text_features, vectorized_features]
+
+
+class TestDuplicateLiterals(unittest.TestCase):
+
+    def features(self, content):
+        results = [engine(content) for engine in ENGINES]
+        for result in results[1:]:
+            self.assertEqual(results[0], result)
+        return results[0]
+
+    def test_binary_clause_with_repeated_literal(self):
+        features = self.features(b'p cnf 3 2\n1 2 3 0\n2 2 0\n')
+        self.assertEqual(features['clauses_count'], 2)
+        self.assertEqual(features['xor2_count'], 0)
+        self.assertEqual(features['xor2_equivalence_count'], 0)
+
+    def test_repeated_literals_are_one_clause(self):
+        features = self.features(b'p cnf 2 3\n1 2 0\n2 1 1 0\n1 1 0\n')
+        self.assertEqual(features['clauses_unique_count'], 2)
+        self.assertEqual(features['literals_count'], 7)
+
+    def test_tautological_literals(self):
+        self.assertEqual(self.features(b'p cnf 2 1\n1 -1 0\n')['tautological_literals_count'], 1)
+        self.assertEqual(self.features(b'p cnf 2 1\n1 -1 2 -2 0\n')['tautological_literals_count'], 2)
+        # repeated literals are counted repeatedly
+        self.assertEqual(self.features(b'p cnf 2 1\n1 1 -1 -1 0\n')['tautological_literals_count'], 2)
+        self.assertEqual(self.features(b'p cnf 2 1\n1 1 2 0\n')['tautological_literals_count'], 0)
+
+    def test_xor2(self):
+        features = self.features(b'p cnf 3 5\n1 2 0\n-2 -1 0\n2 -3 0\n-2 3 0\n3 3 0\n')
+        self.assertEqual(features['xor2_count'], 1)
+        self.assertEqual(features['xor2_equivalence_count'], 1)
+
+
+class TestParity(unittest.TestCase):
+
+    def assertParity(self, content, groups=collect.GROUPS):
+        expected = stream_features(content, groups=groups)
+        for engine in ENGINES:
+            for chunk_size in CHUNK_SIZES:
+                with self.subTest(engine=engine.__name__, chunk_size=chunk_size):
+                    self.assertEqual(expected, engine(content, chunk_size, groups))
+
+    def test_random(self):
+        for seed in range(20):
+            with self.subTest(seed=seed):
+                self.assertParity(random_cnf(seed))
+
+    def test_random_groups(self):
+        for seed in range(5):
+            for group in collect.GROUPS:
+                with self.subTest(seed=seed, group=group):
+                    self.assertParity(random_cnf(seed), {group})
+
+    def test_random_empty_clauses(self):
+        # the standard deviation of variables of an empty clause is undefined
+        groups = set(collect.GROUPS) - {'expensive'}
+        for seed in range(20):
+            with self.subTest(seed=seed):
+                self.assertParity(random_cnf(seed, empty=True), groups)
+
+    def test_empty_clause_expensive(self):
+        content = b'p cnf 2 3\n1 2 0\n0\n-2 0\n'
+        for engine in ENGINES:
+            with self.subTest(engine=engine.__name__):
+                with self.assertRaises(statistics.StatisticsError):
+                    engine(content)
+
+
+class TestSharded(unittest.TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.filepath = os.path.join(tmpdir.name, 'f.cnf')
+        lines = random_cnf(1, nbclauses=300).split(b'\n')
+        # comment lines within the clauses
+        for i in range(len(lines) - 1, 2, -37):
+            lines.insert(i, b'c comment')
+        self.content = b'\n'.join(lines)
+        with open(self.filepath, 'wb') as fd:
+            fd.write(self.content)
+        self.expected = stream_features(self.content)
+        self.clauses_start = self.content.index(b'\n', self.content.index(b'p cnf')) + 1
+
+    def test_ranges(self):
+        for n in (1, 2, 3, 7, 40):
+            header, ranges = dimacs.split_ranges(self.filepath, n)
+            with self.subTest(n=n):
+                self.assertEqual(header, (12, 300))
+                self.assertEqual(len(ranges), n)
+                self.assertEqual(ranges[0][0], self.clauses_start)
+                self.assertEqual(ranges[-1][1], len(self.content))
+                for (start, end), (next_start, next_end) in zip(ranges, ranges[1:]):
+                    self.assertEqual(end, next_start)
+                    self.assertEqual(self.content[end - 1:end], b'\n')
+
+    def test_merge(self):
+        for engine in ('stream', 'vectorized'):
+            for n in (2, 3, 7):
+                header, ranges = dimacs.split_ranges(self.filepath, n)
+                states = [scripts.collect_range(self.filepath, start, end, header, engine=engine)
+                          for start, end in ranges]
+                for state in states[1:]:
+                    states[0].merge(state)
+                with self.subTest(engine=engine, n=n):
+                    self.assertEqual(states[0].finalize(), self.expected)
+
+    def test_collect_sharded(self):
+        state, meta = scripts.collect_sharded(self.filepath, 3, hashes=True)
+        self.assertEqual(state.finalize(), self.expected)
+        self.assertEqual(set(meta), {'@md5sum', '@sha1sum', '@cnfhash'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+"""
+    tests.test_scripts
+    ------------------
+
+    Evaluation of CNF files by :mod:`cnfanalysis.scripts`.
+
+    (C) 2015-2016, CC-0, Lukas Prokop
+"""
+
+import os
+import gzip
+import tempfile
+import unittest
+import contextlib
+
+from cnfanalysis import scripts
+
+
+CONTENT = b'c example\np cnf 3 3\n1 -2 0\n2 3 0\n-1 0\n'
+
+
+class TestOutfile(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.filepath = os.path.join(self.tmpdir.name, 'f.cnf.gz')
+        with gzip.open(self.filepath, 'wb') as fd:
+            fd.write(CONTENT)
+        self.outfile = scripts.derive_outfile(self.filepath, 'json')
+
+    def evaluate(self, **kwargs):
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), \
+                contextlib.redirect_stderr(devnull):
+            return scripts.evaluate_file(self.filepath, self.outfile, 'json', **kwargs)
+
+    def test_derive_outfile(self):
+        self.assertEqual(self.outfile, os.path.join(self.tmpdir.name, 'f.stats.json'))
+        self.assertEqual(scripts.derive_outfile('g.cnf', 'xml'), 'g.stats.xml')
+
+    def test_skip_existing(self):
+        self.assertIsNotNone(self.evaluate())
+        self.assertIsNone(self.evaluate(skip_existing=True))
+
+    def test_backup_existing(self):
+        self.evaluate()
+        self.assertIsNotNone(self.evaluate())
+        backups = [f for f in os.listdir(self.tmpdir.name) if '.backup' in f]
+        self.assertEqual(len(backups), 1)
+        self.assertTrue(backups[0].startswith('f.cnf.gz.backup'))
+        self.assertTrue(os.path.exists(self.outfile))
+
+
+if __name__ == '__main__':
+    unittest.main()